@@ -0,0 +1,205 @@
+import functools
+import hashlib
+import time
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+MODEL_VERSION_PREFIX = "model-version"
+RESPONSE_CACHE_PREFIX = "response"
+RESPONSE_STATS_PREFIX = "response-stats"
+
+
+def model_version_key(model):
+    return "%s:%s" % (MODEL_VERSION_PREFIX, model._meta.label_lower)
+
+
+def current_model_versions(models):
+    """
+    The versions of `models` as one string, or None when the counters can't
+    be read back (a dummy cache backend, or redis being unavailable), in
+    which case nothing keyed on them may be reused.
+    """
+    keys = [model_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        for key in keys:
+            if key not in versions:
+                cache.add(key, initial_version())
+        versions = cache.get_many(keys)
+        if len(versions) < len(keys):
+            return None
+    return ".".join(str(versions[key]) for key in keys)
+
+
+def initial_version():
+    """
+    Where a lost or evicted version counter starts over: the current time in
+    milliseconds, above any version it reached before, so entries cached
+    under those old versions are never reached again.
+    """
+    return int(time.time() * 1000)
+
+
+def incr_key(key, timeout=None, start=0):
+    cache.add(key, start, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, start + 1, timeout)
+        return start + 1
+
+
+def bump_model_version(model):
+    """
+    Invalidates every cached response that declared `model` as a dependency.
+    Inside a transaction the bump waits for the commit: bumped earlier, a
+    concurrent read could cache the old rows under the new version.
+    """
+    key = model_version_key(model)
+    transaction.on_commit(lambda: incr_key(key, start=initial_version()))
+
+
+def record_cache_stat(view_name, outcome):
+    incr_key("%s:%s:%s" % (RESPONSE_STATS_PREFIX, view_name, outcome))
+
+
+def get_cache_stats(view_names):
+    keys = ["%s:%s:%s" % (RESPONSE_STATS_PREFIX, name, outcome)
+            for name in view_names for outcome in ("hit", "miss")]
+    counters = cache.get_many(keys)
+    stats = {}
+    for name in view_names:
+        hits = counters.get("%s:%s:hit" % (RESPONSE_STATS_PREFIX, name), 0)
+        misses = counters.get("%s:%s:miss" % (RESPONSE_STATS_PREFIX, name), 0)
+        stats[name] = {"hit": hits, "miss": misses}
+    return stats
+
+
+def reset_cache_stats(view_names):
+    cache.delete_many(["%s:%s:%s" % (RESPONSE_STATS_PREFIX, name, outcome)
+                       for name in view_names
+                       for outcome in ("hit", "miss")])
+
+
+class VersionedArtifact(object):
+    """
+    A value derived from `models`, kept both in process memory and in redis
+    under the current version of those models. `build` only runs again after
+    one of the models changed; the in-process copy is also dropped after
+    `local_timeout` seconds. Without readable version counters (see
+    `current_model_versions`) the value is built on every call.
+    """
+
+    def __init__(self, name, models, build, timeout=None, local_timeout=300):
+        self.name = name
+        self.models = models
+        self.build = build
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self._local = (None, None, 0)
+
+    def get(self):
+        version = current_model_versions(self.models)
+        if version is None:
+            return self.build()
+        local_version, value, loaded_at = self._local
+        if local_version == version and \
+                time.time() - loaded_at < self.local_timeout:
+            return value
+        key = "artifact:%s:%s" % (self.name, version)
+        value = cache.get(key)
+        if value is None:
+            value = self.build()
+            cache.set(key, value, self.timeout)
+        self._local = (version, value, time.time())
+        return value
+
+
+class CachedResponseMixin(object):
+    """
+    Caches the data of read responses in redis. Keys embed the version of
+    every model listed in `cache_models`, so a save or delete on one of those
+    models (see `invalidate_response_cache` in models.py) makes exactly the
+    dependent entries unreachable.
+    """
+    cache_models = ()
+    cache_actions = ('list', 'retrieve')
+    cache_timeout = settings.RESPONSE_CACHE_TIMEOUT
+
+    def get_response_cache_key(self, request):
+        """
+        None when the model versions can't be read, since counters that
+        start over from 0 would reach keys of long gone data again.
+        """
+        versions = current_model_versions(self.cache_models)
+        if versions is None:
+            return None
+        path = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return "%s:%s:%s:%s:%s" % (
+            RESPONSE_CACHE_PREFIX, self.__class__.__name__, self.action, path,
+            versions)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if self.action not in self.cache_actions or request.method != "GET":
+            return handler(request, *args, **kwargs)
+        view_name = self.__class__.__name__
+        key = self.get_response_cache_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+        data = cache.get(key)
+        if data is not None:
+            record_cache_stat(view_name, "hit")
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+        response = handler(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+            record_cache_stat(view_name, "miss")
+            response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super(CachedResponseMixin, self).list,
+                                    request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super(CachedResponseMixin, self).retrieve,
+            request, *args, **kwargs)
+
+
+def conditional_response(validators):
+    """
+    Decorates a view method with ETag / Last-Modified handling.
+    `validators(view, request, *args, **kwargs)` returns a tuple of
+    (etag, last_modified) built from cheap change markers, so unchanged
+    resources are answered with 304 before any serialization runs.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return func(self, request, *args, **kwargs)
+            etag, last_modified = validators(self, request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+            timestamp = None
+            if last_modified:
+                timestamp = timegm(last_modified.utctimetuple())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = func(self, request, *args, **kwargs)
+            if etag and not response.has_header("ETag"):
+                response["ETag"] = etag
+            if timestamp and not response.has_header("Last-Modified"):
+                response["Last-Modified"] = http_date(timestamp)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,50 @@
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, Polygon
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class GeometryFilterBackend(BaseFilterBackend):
+    """
+    `?in_bbox=xmin,ymin,xmax,ymax` keeps rows whose geometry overlaps the
+    box (`&&`), `?within_polygon=` (WKT or GeoJSON, EPSG:4326) rows that
+    intersect the polygon (ST_Intersects). Both use the GiST index on the
+    view's `geometry_filter_field`, `location` by default, and combine with
+    the other filters and pagination.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        field = getattr(view, 'geometry_filter_field', 'location')
+        params = request.query_params
+        if params.get('in_bbox'):
+            queryset = queryset.filter(**{
+                field + '__bboverlaps': self.parse_bbox(params['in_bbox'])})
+        if params.get('within_polygon'):
+            queryset = queryset.filter(**{
+                field + '__intersects': self.parse_polygon(
+                    params['within_polygon'])})
+        return queryset
+
+    @staticmethod
+    def parse_bbox(value):
+        try:
+            xmin, ymin, xmax, ymax = [float(v) for v in value.split(',')]
+        except ValueError:
+            raise ValidationError(
+                {'in_bbox': 'must be xmin,ymin,xmax,ymax'})
+        bbox = Polygon.from_bbox((xmin, ymin, xmax, ymax))
+        bbox.srid = 4326
+        return bbox
+
+    @staticmethod
+    def parse_polygon(value):
+        try:
+            polygon = GEOSGeometry(value, srid=4326)
+        except (GEOSException, GDALException, ValueError):
+            raise ValidationError(
+                {'within_polygon': 'must be a WKT or GeoJSON polygon'})
+        if polygon.geom_type not in ('Polygon', 'MultiPolygon') or \
+                not polygon.valid:
+            raise ValidationError(
+                {'within_polygon': 'must be a valid polygon'})
+        return polygon
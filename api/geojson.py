@@ -0,0 +1,57 @@
+from django.db.models import TextField
+from django.db.models.expressions import RawSQL
+
+FEATURE_COLLECTION_HEADER = (
+    '{"type": "FeatureCollection", "crs": {"type": "name", "properties": '
+    '{"name": "EPSG:4326"}}, "features": [')
+FEATURE_COLLECTION_FOOTER = ']}'
+
+
+def feature_sql(model, geometry_field, fields):
+    """
+    SQL building one GeoJSON Feature per row, with the same properties as
+    django's geojson serializer (foreign keys as ids, `pk` as a string).
+    """
+    table = model._meta.db_table
+
+    def column(field):
+        return '"{}"."{}"'.format(table, field.column)
+
+    properties = []
+    for name in fields:
+        field = model._meta.get_field(name)
+        properties.append("'{}', {}".format(name, column(field)))
+    properties.append("'pk', {}::text".format(column(model._meta.pk)))
+    geometry = column(model._meta.get_field(geometry_field))
+    return ("json_build_object('type', 'Feature', 'properties', "
+            "json_build_object({}), 'geometry', ST_AsGeoJSON({})::json)::text"
+            ).format(', '.join(properties), geometry)
+
+
+def stream_feature_collection(queryset, geometry_field, fields,
+                              chunk_size=2000):
+    """
+    Yields a FeatureCollection as bytes. Features are rendered by PostGIS and
+    read through a server-side cursor, so python never parses or re-encodes
+    them and memory stays bounded by `chunk_size`.
+    """
+    model = queryset.model
+    fields = [name for name in fields
+              if name not in ('pk', geometry_field)]
+    features = queryset.annotate(
+        feature=RawSQL(feature_sql(model, geometry_field, fields), (),
+                       output_field=TextField())
+    ).values_list('feature', flat=True).iterator(chunk_size=chunk_size)
+
+    yield FEATURE_COLLECTION_HEADER.encode('utf-8')
+    separator = ''
+    batch = []
+    for feature in features:
+        batch.append(feature)
+        if len(batch) == chunk_size:
+            yield (separator + ', '.join(batch)).encode('utf-8')
+            separator = ', '
+            batch = []
+    if batch:
+        yield (separator + ', '.join(batch)).encode('utf-8')
+    yield FEATURE_COLLECTION_FOOTER.encode('utf-8')
@@ -4,6 +4,7 @@ from apiclient.discovery import build
 from django.conf import settings
 from oauth2client.service_account import ServiceAccountCredentials
 
+from api.cache import bump_model_version
 from api.models import ApplicationStat, UserLocation, UserReport
 
 
@@ -83,6 +84,7 @@ def print_results(results):
             self_assessments=self_assessments,
             user_reports=user_reports
         )
+        bump_model_version(ApplicationStat)
         print('Site visits updated')
 
     else:
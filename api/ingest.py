@@ -0,0 +1,299 @@
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, transaction
+from django.db.models import IntegerField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+from redis.exceptions import ConnectionError as RedisConnectionError, \
+    TimeoutError as RedisTimeoutError
+
+from api.cache import bump_model_version
+from api.models import MuniData, DistrictData, ProvinceData, Municipality, \
+    District, UserReport, ROLLUP_FIELDS
+
+
+SNAPSHOT_LEVELS = {
+    'municipality': (MuniData, 'municipality_id', Municipality),
+    'district': (DistrictData, 'district_id', District),
+}
+
+
+class SnapshotIngestError(ValueError):
+    pass
+
+
+def snapshot_value_fields(model):
+    return [f.name for f in model._meta.fields if isinstance(f, IntegerField)]
+
+
+def read_snapshot_file(uploaded, name=None):
+    """
+    Reads a batch of snapshot rows from a csv or json file object.
+    """
+    name = name or getattr(uploaded, 'name', '') or ''
+    content = uploaded.read()
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if name.lower().endswith('.json'):
+        try:
+            rows = json.loads(content)
+        except ValueError:
+            raise SnapshotIngestError('file is not valid json')
+        if not isinstance(rows, list):
+            raise SnapshotIngestError('json batch must be a list of rows')
+        return rows
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+def ingest_snapshots(level, rows):
+    """
+    Replaces the active snapshot of every unit in `rows` with a new one.
+    Prior active rows are deactivated with one UPDATE and the new rows are
+    inserted with bulk_create, all inside a single transaction.
+    """
+    if level not in SNAPSHOT_LEVELS:
+        raise SnapshotIngestError('unknown level {}'.format(level))
+    model, unit_field, unit_model = SNAPSHOT_LEVELS[level]
+    value_fields = snapshot_value_fields(model)
+    started = time.time()
+
+    snapshots = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise SnapshotIngestError('row {} is not an object'.format(index))
+        try:
+            unit = int(row[unit_field])
+            values = {f: int(float(row[f])) if row.get(f) not in (None, '')
+                      else 0 for f in value_fields}
+        except KeyError:
+            raise SnapshotIngestError('row {} has no {}'.format(
+                index, unit_field))
+        except (TypeError, ValueError):
+            raise SnapshotIngestError('row {} has a non numeric value'.format(
+                index))
+        if unit in snapshots:
+            raise SnapshotIngestError('{} {} appears twice'.format(
+                unit_field, unit))
+        values['hotline'] = row.get('hotline') or ''
+        snapshots[unit] = values
+
+    if level == 'municipality':
+        parents = {pk: (district, province) for pk, district, province in
+                   unit_model.objects.filter(pk__in=snapshots).values_list(
+                       'id', 'district_id', 'province_id')}
+    else:
+        parents = {pk: (None, province) for pk, province in
+                   unit_model.objects.filter(pk__in=snapshots).values_list(
+                       'id', 'province_id')}
+    missing = sorted(set(snapshots) - set(parents))
+    if missing:
+        raise SnapshotIngestError('unknown {}: {}'.format(
+            unit_field, ', '.join(str(pk) for pk in missing)))
+
+    objects = []
+    for unit, values in snapshots.items():
+        district, province = parents[unit]
+        snapshot = model(active=True, **values)
+        setattr(snapshot, model._meta.get_field(unit_field).attname, unit)
+        snapshot.province_id_id = province
+        if level == 'municipality':
+            snapshot.district_id_id = district
+        objects.append(snapshot)
+
+    rollup = settings.SNAPSHOT_ROLLUP and level == 'municipality'
+    with transaction.atomic():
+        previous = model.objects.filter(
+            active=True, **{'{}__in'.format(unit_field): list(snapshots)})
+        if rollup:
+            old_values = {row[0]: row[1:] for row in previous.values_list(
+                unit_field, *ROLLUP_FIELDS)}
+        previous.update(active=False, update_date=timezone.now())
+        model.objects.bulk_create(objects, batch_size=500)
+        if rollup:
+            rollup_municipality_snapshots(snapshots, old_values, parents)
+    # neither .update() nor bulk_create send post_save
+    bump_model_version(model)
+
+    elapsed = time.time() - started
+    return {
+        'level': level,
+        'rows': len(objects),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(len(objects) / elapsed, 1) if elapsed else
+        len(objects),
+    }
+
+
+def rollup_municipality_snapshots(snapshots, old_values, parents):
+    """
+    Folds the change of every ingested municipality into its district and
+    province, so each parent row is touched once per batch.
+    """
+    district_deltas = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    province_deltas = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    for unit, values in snapshots.items():
+        district, province = parents[unit]
+        old = old_values.get(unit) or (0,) * len(ROLLUP_FIELDS)
+        for field, old_value in zip(ROLLUP_FIELDS, old):
+            delta = values[field] - (old_value or 0)
+            district_deltas[district][field] += delta
+            province_deltas[province][field] += delta
+    DistrictData.apply_rollup(district_deltas)
+    ProvinceData.apply_rollup(province_deltas)
+
+
+USER_REPORT_BUFFER_KEY = 'user-report-buffer'
+# reports taken off the buffer by the running flush, dropped once committed
+USER_REPORT_PROCESSING_KEY = USER_REPORT_BUFFER_KEY + ':processing'
+# reports that can't be written, kept aside for inspection
+USER_REPORT_DEAD_KEY = USER_REPORT_BUFFER_KEY + ':dead'
+USER_REPORT_FLUSH_LOCK = USER_REPORT_BUFFER_KEY + ':flushing'
+USER_REPORT_FLUSH_QUEUED = USER_REPORT_BUFFER_KEY + ':queued'
+USER_REPORT_FLUSH_TIMEOUT = 10 * 60
+# raised by buffer_user_report while redis is away; IGNORE_EXCEPTIONS only
+# covers the cache API, not the raw connection the buffer uses
+BUFFER_UNAVAILABLE_ERRORS = (RedisConnectionError, RedisTimeoutError)
+# errors caused by the report itself rather than by the database being away
+BAD_REPORT_ERRORS = (ValueError, TypeError, LookupError, DataError,
+                     IntegrityError, ValidationError)
+
+
+def encode_user_report(data):
+    """
+    JSON for the validated data of a report: related objects become their
+    ids and geometries EWKT, so buffered reports survive model changes.
+    The submission time goes along as update_date.
+    """
+    values = {'update_date': timezone.now()}
+    for name, value in data.items():
+        field = UserReport._meta.get_field(name)
+        if field.is_relation:
+            name, value = field.attname, getattr(value, 'pk', value)
+        elif isinstance(value, GEOSGeometry):
+            value = value.ewkt
+        values[name] = value
+    return json.dumps(values, cls=DjangoJSONEncoder)
+
+
+def decode_user_report(item):
+    """
+    An unsaved UserReport with its derived fields from a buffered item.
+    Columns the model no longer has are dropped.
+    """
+    columns = {f.attname for f in UserReport._meta.concrete_fields}
+    values = {name: value for name, value in json.loads(item).items()
+              if name in columns}
+    if values.get('update_date'):
+        values['update_date'] = parse_datetime(values['update_date'])
+    report = UserReport(**values)
+    report.assign_derived_fields(administrative_units=False)
+    return report
+
+
+def insert_user_reports(items):
+    """
+    bulk_create for buffered items, keeping their submission time: the
+    auto_now_add update_date would otherwise be the time of the flush.
+    """
+    reports = [decode_user_report(item) for item in items]
+    submitted = [report.update_date for report in reports]
+    UserReport.objects.bulk_create(reports)
+    for report, update_date in zip(reports, submitted):
+        report.update_date = update_date or report.update_date
+    UserReport.objects.bulk_update(reports, ['update_date'])
+    return [report.id for report in reports]
+
+
+def buffer_user_report(data):
+    """
+    Appends the validated data of a report to the redis buffer and returns
+    the number of reports waiting in it. New reports go to the head of the
+    list, the flush takes the oldest from its tail.
+    """
+    return get_redis_connection('default').lpush(USER_REPORT_BUFFER_KEY,
+                                                 encode_user_report(data))
+
+
+def request_user_report_flush():
+    """
+    True for the first caller since the last flush started, so a full
+    buffer queues one flush_user_reports instead of one per request.
+    """
+    return cache.add(USER_REPORT_FLUSH_QUEUED, True,
+                     USER_REPORT_FLUSH_TIMEOUT)
+
+
+def write_user_reports(items):
+    """
+    Inserts buffered items and returns the new ids. A batch that fails is
+    retried one report at a time; reports failing on their own are moved to
+    the dead letter list, database outages propagate.
+    """
+    try:
+        with transaction.atomic():
+            return insert_user_reports(items)
+    except BAD_REPORT_ERRORS:
+        pass
+    ids = []
+    dead = []
+    for item in items:
+        try:
+            with transaction.atomic():
+                ids.extend(insert_user_reports([item]))
+        except BAD_REPORT_ERRORS:
+            dead.append(item)
+    if dead:
+        get_redis_connection('default').lpush(USER_REPORT_DEAD_KEY, *dead)
+    return ids
+
+
+def flush_user_report_buffer(batch_size=None):
+    """
+    Writes buffered reports with one bulk_create per batch, then assigns
+    their administrative units with one spatial join. Each batch is moved to
+    a processing list first and only dropped from it after the insert
+    committed, so a crashed flush leaves its batch to the next one (which
+    may then write it twice) instead of losing it. Returns the reports
+    written.
+    """
+    batch_size = batch_size or settings.USER_REPORT_BUFFER_BATCH
+    if not cache.add(USER_REPORT_FLUSH_LOCK, True, USER_REPORT_FLUSH_TIMEOUT):
+        return 0
+    client = get_redis_connection('default')
+    written = 0
+    try:
+        cache.delete(USER_REPORT_FLUSH_QUEUED)
+        while True:
+            # a batch left over by a flush that died is written first
+            items = client.lrange(USER_REPORT_PROCESSING_KEY, 0, -1)
+            if not items:
+                pipe = client.pipeline(transaction=False)
+                for _ in range(batch_size):
+                    pipe.rpoplpush(USER_REPORT_BUFFER_KEY,
+                                   USER_REPORT_PROCESSING_KEY)
+                items = [item for item in pipe.execute() if item is not None]
+            if not items:
+                break
+            ids = write_user_reports(items)
+            client.delete(USER_REPORT_PROCESSING_KEY)
+            if ids:
+                UserReport.assign_administrative_units_in_range(
+                    min(ids), max(ids) + 1)
+            written += len(ids)
+            if len(items) < batch_size:
+                break
+    finally:
+        cache.delete(USER_REPORT_FLUSH_LOCK)
+    if written:
+        bump_model_version(UserReport)
+    return written
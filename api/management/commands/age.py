@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 import pandas as pd
+from api.cache import bump_model_version
 from api.models import MedicalFacility, MedicalFacilityType, \
     MedicalFacilityCategory, Province, Municipality, District, AgeGroupData
 
@@ -54,6 +55,7 @@ class Command(BaseCommand):
             ) for row in range(0, upper_range)
         ]
         medical = AgeGroupData.objects.bulk_create(objects)
+        bump_model_version(AgeGroupData)
 
         if medical:
             self.stdout.write('Successfully loaded Medical Value  ..')
@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from api.cache import bump_model_version
+from api.models import UserReport
+
+
+class Command(BaseCommand):
+    help = 'backfill the province, district and municipality of user ' \
+           'reports with one spatial join per id range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20000)
+        parser.add_argument('--checkpoint', type=str,
+                            default='assign_report_units.checkpoint',
+                            help='file holding the next id to process')
+        parser.add_argument('--restart', action='store_true',
+                            help='ignore the checkpoint and start over')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        checkpoint = kwargs['checkpoint']
+        bounds = UserReport.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('No reports')
+            return
+        start = bounds['first']
+        if not kwargs['restart'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start = max(start, int(f.read().strip() or 0))
+            self.stdout.write('Resuming from id {}'.format(start))
+
+        started = time.time()
+        assigned = 0
+        while start <= bounds['last']:
+            end = start + batch_size
+            batch_started = time.time()
+            updated = UserReport.assign_administrative_units_in_range(
+                start, end)
+            assigned += updated
+            with open(checkpoint, 'w') as f:
+                f.write(str(end))
+            elapsed = time.time() - started
+            self.stdout.write(
+                'ids {}-{}: {} assigned in {:.2f}s, {} total '
+                '({:.0f} rows/sec)'.format(
+                    start, end - 1, updated, time.time() - batch_started,
+                    assigned, assigned / max(elapsed, 0.001)))
+            start = end
+        os.remove(checkpoint)
+        bump_model_version(UserReport)
+        self.stdout.write('Done, {} reports assigned'.format(assigned))
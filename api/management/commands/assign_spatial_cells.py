@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_model_version
+from api.models import UserLocation, UserReport
+from api.spatial import CELL_ZOOMS
+
+CELL_FIELDS = ['cell_z{}'.format(z) for z in CELL_ZOOMS]
+
+
+class Command(BaseCommand):
+    help = 'backfill the quadkey cell columns of reports and location pings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **kwargs):
+        for model in (UserReport, UserLocation):
+            self.backfill(model, kwargs['batch_size'])
+
+    def backfill(self, model, batch_size):
+        pending = model.objects.filter(cell_z8__isnull=True,
+                                       location__isnull=False)
+        started = time.time()
+        done = 0
+        last_id = 0
+        while True:
+            rows = list(pending.filter(id__gt=last_id).order_by('id')
+                        .only('id', 'location')[:batch_size])
+            if not rows:
+                break
+            for row in rows:
+                row.assign_spatial_cells()
+            model.objects.bulk_update(rows, CELL_FIELDS)
+            last_id = rows[-1].id
+            done += len(rows)
+            self.stdout.write('{} {} rows ({:.0f} rows/sec)'.format(
+                model.__name__, done, done / max(time.time() - started,
+                                                 0.001)))
+        bump_model_version(model)
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.models import MedicalFacility
+from api.serializers import MedicalFacilitySerializer, \
+    MedicalFacilityValuesSerializer
+
+
+class Command(BaseCommand):
+    help = 'compare the facility list serializer with the values() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **kwargs):
+        repeat = kwargs['repeat']
+        queryset = MedicalFacility.objects.select_related(
+            'type', 'municipality', 'district', 'province', 'category')
+        fast = MedicalFacilityValuesSerializer()
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            return renderer.render(
+                MedicalFacilitySerializer(queryset.all(), many=True).data)
+
+        def values_path():
+            return renderer.render(
+                fast.to_representation(fast.values(queryset.all())))
+
+        if serializer_path() != values_path():
+            raise CommandError('values() output differs from the serializer')
+
+        timings = {}
+        for name, path in (('serializer', serializer_path),
+                           ('values', values_path)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                path()
+            timings[name] = (time.perf_counter() - started) / repeat
+        self.stdout.write('{} facilities, {} runs each'.format(
+            queryset.count(), repeat))
+        for name, seconds in timings.items():
+            self.stdout.write('{:<12} {:.1f} ms'.format(name, seconds * 1000))
+        if timings['values']:
+            self.stdout.write('speedup      {:.1f}x'.format(
+                timings['serializer'] / timings['values']))
@@ -0,0 +1,72 @@
+import json
+import time
+import tracemalloc
+
+from django.contrib.gis.geos import Point
+from django.core.serializers import serialize
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.geojson import stream_feature_collection
+from api.models import MedicalFacility, MedicalFacilityCategory, \
+    MedicalFacilityType
+from api.views import FACILITY_GEOJSON_FIELDS
+
+
+def python_geojson(queryset):
+    geojson = json.loads(serialize('geojson', queryset,
+                                   geometry_field='location',
+                                   fields=FACILITY_GEOJSON_FIELDS))
+    return JSONRenderer().render(geojson)
+
+
+def database_geojson(queryset):
+    return b''.join(stream_feature_collection(queryset, 'location',
+                                              FACILITY_GEOJSON_FIELDS))
+
+
+def measure(func, queryset):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = len(func(queryset))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+class Command(BaseCommand):
+    help = 'compare python and PostGIS GeoJSON generation for facilities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--features', type=int, nargs='+',
+                            default=[10000, 100000])
+
+    def handle(self, *args, **kwargs):
+        for count in kwargs['features']:
+            with transaction.atomic():
+                self.seed(count)
+                queryset = MedicalFacility.objects.order_by('id')
+                self.stdout.write('{} features'.format(queryset.count()))
+                for name, func in (('python', python_geojson),
+                                   ('postgis', database_geojson)):
+                    elapsed, peak, size = measure(func, queryset)
+                    self.stdout.write(
+                        '  {:<8} {:>9.1f} ms  peak {:>8.1f} MB  body {:>8.1f} '
+                        'MB'.format(name, elapsed * 1000, peak / 2 ** 20,
+                                    size / 2 ** 20))
+                transaction.set_rollback(True)
+
+    def seed(self, count):
+        category = MedicalFacilityCategory.objects.create(name='benchmark')
+        facility_type = MedicalFacilityType.objects.create(
+            category=category, name='benchmark')
+        MedicalFacility.objects.bulk_create([
+            MedicalFacility(
+                name='facility {}'.format(i), category=category,
+                type=facility_type, lat=27 + (i % 1000) / 1000.0,
+                long=85 + (i // 1000) / 1000.0,
+                location=Point(85 + (i // 1000) / 1000.0,
+                               27 + (i % 1000) / 1000.0, srid=4326))
+            for i in range(count)], batch_size=5000)
@@ -1,26 +1,118 @@
-from django.core.management.base import BaseCommand
-from api.models import ProvinceData, MuniData, DistrictData, Province, \
-    District, Municipality, UserReport
+import json
+import os
+import time
+from multiprocessing import Pool
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, reset_queries
+from django.db.models import Max, Min
 
-class Command(BaseCommand):
-    help = 'create default datas /setup'
+from api.cache import bump_model_version
+from api.models import UserReport
+
+READ_FIELDS = ['id', 'location', 'lat', 'long', 'travel_history',
+               'temperature', 'has_travel_history', 'has_convid_contact',
+               'result']
+DERIVED_FIELDS = ['location', 'lat', 'long', 'cell_z8', 'cell_z12',
+                  'cell_z16', 'travel_data', 'country_name', 'flight_name',
+                  'has_travel_history', 'has_convid_contact', 'result']
+
+
+def rescore_range(args):
+    """
+    Recomputes the derived fields of reports with start <= id < end in one
+    worker: rows are streamed, updated with bulk_update every `batch_size`
+    rows and their administrative units assigned again with one spatial
+    join, since a recomputed location may fall in another municipality.
+    """
+    start, end, batch_size = args
+    rows = 0
+    batch = []
+    reports = UserReport.objects.filter(id__gte=start, id__lt=end).only(
+        *READ_FIELDS).order_by('id').iterator(chunk_size=batch_size)
+    for report in reports:
+        report.assign_derived_fields(administrative_units=False)
+        batch.append(report)
+        if len(batch) == batch_size:
+            UserReport.objects.bulk_update(batch, DERIVED_FIELDS)
+            rows += len(batch)
+            batch = []
+            # DEBUG keeps every query in memory otherwise
+            reset_queries()
+    if batch:
+        UserReport.objects.bulk_update(batch, DERIVED_FIELDS)
+        rows += len(batch)
+    UserReport.assign_administrative_units_in_range(start, end,
+                                                    reassign=True)
+    reset_queries()
+    return start, rows
 
-    def handle(self, *args, **kwargs):
-        # province_list = Province.objects.all()
-        # district_list = District.objects.all()
-        # municipality_list = Municipality.objects.all()
-        report_list = UserReport.objects.all()
 
-        # for p in province_list:
-        #     ProvinceData.objects.get_or_create(active=True, province_id=p)
-        # for d in district_list:
-        #     DistrictData.objects.get_or_create(district_id=d, active=True)
-        # for m in municipality_list:
-        #     MuniData.objects.get_or_create(municipality_id=m, active=True)
-        # print("created")
+def close_connections():
+    # forked workers must not share the parent's database connection
+    connections.close_all()
 
-        for r in report_list:
-            r.save()
 
+class Command(BaseCommand):
+    help = 'recompute the derived fields of every user report in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--range-size', type=int, default=50000,
+                            help='ids handed to a worker at a time')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='rows per bulk_update')
+        parser.add_argument('--checkpoint', type=str,
+                            default='datas_generate.checkpoint',
+                            help='file listing the finished id ranges')
+        parser.add_argument('--restart', action='store_true',
+                            help='ignore the checkpoint and start over')
+
+    def handle(self, *args, **kwargs):
+        range_size = kwargs['range_size']
+        checkpoint = kwargs['checkpoint']
+        bounds = UserReport.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('No reports')
+            return
+
+        finished = set()
+        if not kwargs['restart'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state = json.load(f)
+            # finished ranges are recorded by their start id only
+            saved_size = state.get('range_size') \
+                if isinstance(state, dict) else None
+            if saved_size != range_size:
+                raise CommandError(
+                    'the checkpoint was written with --range-size {}; resume '
+                    'with it or pass --restart'.format(saved_size))
+            finished = set(state['finished'])
+            self.stdout.write('Resuming, {} ranges already done'.format(
+                len(finished)))
+        ranges = [(start, start + range_size, kwargs['batch_size'])
+                  for start in range(bounds['first'], bounds['last'] + 1,
+                                     range_size)
+                  if start not in finished]
+        total = len(ranges)
 
+        close_connections()
+        started = time.time()
+        rows = 0
+        with Pool(kwargs['workers'], initializer=close_connections) as pool:
+            for done, (start, count) in enumerate(
+                    pool.imap_unordered(rescore_range, ranges), 1):
+                rows += count
+                finished.add(start)
+                with open(checkpoint, 'w') as f:
+                    json.dump({'range_size': range_size,
+                               'finished': sorted(finished)}, f)
+                elapsed = time.time() - started
+                eta = elapsed / done * (total - done)
+                self.stdout.write(
+                    '{}/{} ranges, {} rows, {:.0f} rows/sec, ETA {:.0f}s'
+                    .format(done, total, rows, rows / max(elapsed, 0.001),
+                            eta))
+        os.remove(checkpoint)
+        bump_model_version(UserReport)
+        self.stdout.write('Done, {} reports updated'.format(rows))
@@ -1,21 +1,24 @@
-import json
 import pandas as pd
 from api.models import UserReport, MedicalFacility
+from django.contrib.postgres.fields.jsonb import KeyTransform
 from django.core.management.base import BaseCommand
 
+TRAVEL_COLUMNS = ['country_name', 'flight_name', 'transit_names']
 
-def travel_data(r):
-    travel_history = r.travel_history
-    try:
-        data = json.loads(travel_history)
-        if not isinstance(data, dict):
-            data = {}
-    except:
-        data = {}
-    country_name = data.get('country_name', '')
-    flight_name = data.get('flight_name', '')
-    transit_names = data.get('transit_names', '')
-    return country_name, flight_name, transit_names
+
+def user_report_export(columns):
+    """
+    UserReport rows for the excel export with the travel columns read from
+    the parsed travel_data, so no json is decoded in python. transit_names
+    keeps the submitted value (a list stays a list), or '' when missing.
+    """
+    rows = UserReport.objects.annotate(
+        transit_names=KeyTransform('transit_names', 'travel_data')
+    ).values(*columns + TRAVEL_COLUMNS)
+    for row in rows.iterator():
+        if row['transit_names'] is None:
+            row['transit_names'] = ''
+        yield row
 
 
 class Command(BaseCommand):
@@ -33,13 +36,10 @@ class Command(BaseCommand):
                        'diarrahoe', 'vomit', 'runny_nose', 'address',
                        'contact_no',
                        'symptoms', 'has_convid_contact',
-                       'has_travel_history', 'result', 'travel_history', 'update_date']
+                       'has_travel_history', 'result', 'update_date']
 
-            query = UserReport.objects.all().values(*columns)
-            df = pd.DataFrame(query, columns=columns)
-            df[['country_name', 'flight_name', 'transit_names']] = df.apply(
-                travel_data, axis=1, result_type="expand")
-            del df['travel_history']
+            query = user_report_export(columns)
+            df = pd.DataFrame(query, columns=columns + TRAVEL_COLUMNS)
             df.to_excel("media/user_assessment_latest.xlsx")
         elif report_type == "facility":
             columns = ['id', 'province__province_id', 'province__name',
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingest import ingest_snapshots, read_snapshot_file, \
+    SnapshotIngestError, SNAPSHOT_LEVELS
+
+
+class Command(BaseCommand):
+    help = 'load a csv/json batch of municipality or district snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('level', type=str, choices=list(SNAPSHOT_LEVELS))
+        parser.add_argument('--path', type=str, required=True)
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+        try:
+            with open(path, 'rb') as f:
+                rows = read_snapshot_file(f, name=path)
+            result = ingest_snapshots(kwargs['level'], rows)
+        except SnapshotIngestError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Loaded {rows} {level} snapshots in {seconds}s '
+                          '({rows_per_second} rows/sec)'.format(**result))
@@ -1,8 +1,9 @@
 from django.contrib.gis.geos import Point
 from django.core.management.base import BaseCommand
 import pandas as pd
+from api.cache import bump_model_version
 from api.models import MedicalFacility, MedicalFacilityType, \
-    MedicalFacilityCategory, Province, Municipality, District
+    MedicalFacilityCategory, Province, Municipality, District, NationalSummary
 
 
 class Command(BaseCommand):
@@ -91,3 +92,8 @@ class Command(BaseCommand):
                       'contact_person', 'contact_num',
                       'used_for_corona_response', 'num_of_bed',
                                                           'occupied_ventilators', 'num_of_ventilators', 'occupied_icu_bed', 'num_of_icu_bed', 'hlcit_code', 'total_positive', 'total_death', 'total_in_isolation', 'occupied_isolation_bed', 'total_tested', 'num_of_isolation_bed', 'remarks', 'lat', 'long'])
+        # bulk writes send no post_save, so cached responses and tiles
+        # are invalidated by hand
+        bump_model_version(MedicalFacility)
+        MedicalFacility.rebuild_unit_counters()
+        NationalSummary.rebuild()
@@ -0,0 +1,49 @@
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_model_version
+from api.models import UserReport
+from api.risk import score_batch
+
+SCORE_COLUMNS = ['id', 'temperature', 'has_travel_history',
+                 'has_convid_contact', 'result']
+
+
+class Command(BaseCommand):
+    help = 'recompute the risk result of every user report with the rules ' \
+           'in api/risk.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=50000)
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='rows per bulk_update statement')
+
+    def handle(self, *args, **kwargs):
+        chunk_size = kwargs['chunk_size']
+        started = time.time()
+        last_id = 0
+        scored = changed = 0
+        while True:
+            rows = list(UserReport.objects.filter(id__gt=last_id)
+                        .order_by('id').values_list(*SCORE_COLUMNS)
+                        [:chunk_size])
+            if not rows:
+                break
+            frame = pd.DataFrame(rows, columns=SCORE_COLUMNS)
+            frame['score'] = score_batch(frame['temperature'],
+                                         frame['has_travel_history'],
+                                         frame['has_convid_contact'])
+            stale = frame[frame['score'] != frame['result']]
+            UserReport.objects.bulk_update(
+                [UserReport(id=pk, result=result) for pk, result in
+                 zip(stale['id'].tolist(), stale['score'].tolist())],
+                ['result'], batch_size=kwargs['batch_size'])
+            last_id = rows[-1][0]
+            scored += len(rows)
+            changed += len(stale)
+            self.stdout.write('{} scored, {} changed ({:.0f} rows/sec)'.format(
+                scored, changed, scored / max(time.time() - started, 0.001)))
+        if changed:
+            bump_model_version(UserReport)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from api import views
+from api.cache import CachedResponseMixin, get_cache_stats, \
+    reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'show response cache hit/miss counters per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='reset the counters after printing them')
+
+    def handle(self, *args, **kwargs):
+        view_names = sorted(view.__name__ for view in
+                            CachedResponseMixin.__subclasses__()
+                            if view.__module__ == views.__name__)
+        stats = get_cache_stats(view_names)
+        for name in view_names:
+            hits = stats[name]['hit']
+            misses = stats[name]['miss']
+            total = hits + misses
+            ratio = (100.0 * hits / total) if total else 0
+            self.stdout.write('{:<20} hit={:<8} miss={:<8} ratio={:.1f}%'.format(
+                name, hits, misses, ratio))
+        if kwargs['reset']:
+            reset_cache_stats(view_names)
+            self.stdout.write('Counters reset ..')
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.10 on 2020-04-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Max, Sum
+
+SUMMARY_FIELDS = (
+    'total_samples_collected', 'total_tested', 'total_negative',
+    'total_in_isolation', 'total_positive', 'total_samples_pending',
+    'total_death', 'total_recovered', 'in_quarantine', 'num_of_bed',
+    'num_of_icu_bed', 'occupied_icu_bed', 'num_of_ventilators',
+    'occupied_ventilators', 'num_of_isolation_bed', 'occupied_isolation_bed',
+)
+
+
+def build_summary(apps, schema_editor):
+    ProvinceData = apps.get_model('api', 'ProvinceData')
+    MedicalFacility = apps.get_model('api', 'MedicalFacility')
+    NationalSummary = apps.get_model('api', 'NationalSummary')
+    totals = ProvinceData.objects.filter(active=True).aggregate(
+        update_date=Max('update_date'),
+        **{f: Sum(f) for f in SUMMARY_FIELDS})
+    values = {f: totals[f] or 0 for f in SUMMARY_FIELDS}
+    values['update_date'] = totals['update_date']
+    values['facility_count'] = MedicalFacility.objects.count()
+    NationalSummary.objects.update_or_create(pk=1, defaults=values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0058_auto_20200416_1105'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NationalSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_samples_collected', models.IntegerField(default=0)),
+                ('total_tested', models.IntegerField(default=0)),
+                ('total_negative', models.IntegerField(default=0)),
+                ('total_in_isolation', models.IntegerField(default=0)),
+                ('total_positive', models.IntegerField(default=0)),
+                ('total_samples_pending', models.IntegerField(default=0)),
+                ('total_death', models.IntegerField(default=0)),
+                ('total_recovered', models.IntegerField(default=0)),
+                ('in_quarantine', models.IntegerField(default=0)),
+                ('num_of_bed', models.IntegerField(default=0)),
+                ('num_of_icu_bed', models.IntegerField(default=0)),
+                ('occupied_icu_bed', models.IntegerField(default=0)),
+                ('num_of_ventilators', models.IntegerField(default=0)),
+                ('occupied_ventilators', models.IntegerField(default=0)),
+                ('num_of_isolation_bed', models.IntegerField(default=0)),
+                ('occupied_isolation_bed', models.IntegerField(default=0)),
+                ('facility_count', models.IntegerField(default=0)),
+                ('update_date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
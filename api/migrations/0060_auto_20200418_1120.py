@@ -0,0 +1,23 @@
+# Generated by Django 2.2.10 on 2020-04-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0059_nationalsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nationalsummary',
+            name='facility_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='nationalsummary',
+            name='facility_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 2.2.10 on 2020-04-18 13:02
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_counters(apps, schema_editor):
+    MedicalFacility = apps.get_model('api', 'MedicalFacility')
+    for model_name, relation in (('Province', 'province'),
+                                 ('District', 'district'),
+                                 ('Municipality', 'municipality')):
+        unit_model = apps.get_model('api', model_name)
+        rows = MedicalFacility.objects.values(relation, 'category_id').annotate(
+            total=Count('id'),
+            corona=Count('id', filter=Q(used_for_corona_response=True)))
+        counters = {}
+        for row in rows:
+            count, corona, categories = counters.get(row[relation], (0, 0, {}))
+            categories[str(row['category_id'])] = row['total']
+            counters[row[relation]] = (count + row['total'],
+                                       corona + row['corona'], categories)
+        units = list(unit_model.objects.only('id'))
+        for unit in units:
+            (unit.facility_count, unit.corona_facility_count,
+             unit.facility_category_count) = counters.get(unit.pk, (0, 0, {}))
+        unit_model.objects.bulk_update(units, [
+            'facility_count', 'corona_facility_count',
+            'facility_category_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0060_auto_20200418_1120'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='district',
+            name='corona_facility_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='facility_category_count',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='facility_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='corona_facility_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='facility_category_count',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='facility_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='province',
+            name='corona_facility_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='province',
+            name='facility_category_count',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='province',
+            name='facility_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.10 on 2020-04-19 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0061_facility_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='provincedata',
+            index=models.Index(fields=['province_id', 'update_date'], name='provincedata_unit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='districtdata',
+            index=models.Index(fields=['district_id', 'update_date'], name='districtdata_unit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='munidata',
+            index=models.Index(fields=['municipality_id', 'update_date'], name='munidata_unit_date_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.10 on 2020-04-20 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0062_snapshot_unit_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userlocation',
+            index=models.Index(fields=['update_date', 'id'], name='userlocation_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userreport',
+            index=models.Index(fields=['update_date', 'id'], name='userreport_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.10 on 2020-04-21 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0063_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userlocation',
+            name='cell_z12',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlocation',
+            name='cell_z16',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlocation',
+            name='cell_z8',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userreport',
+            name='cell_z12',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userreport',
+            name='cell_z16',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userreport',
+            name='cell_z8',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+    ]
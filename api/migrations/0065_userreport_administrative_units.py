@@ -0,0 +1,29 @@
+# Generated by Django 2.2.10 on 2020-04-21 14:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0064_spatial_cells'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userreport',
+            name='district',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reports', to='api.District'),
+        ),
+        migrations.AddField(
+            model_name='userreport',
+            name='municipality',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reports', to='api.Municipality'),
+        ),
+        migrations.AddField(
+            model_name='userreport',
+            name='province',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reports', to='api.Province'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.10 on 2020-04-22 08:40
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+SIMPLIFY_SQL = (
+    'UPDATE api_municipality SET '
+    'geom_low = ST_Multi(ST_SimplifyPreserveTopology(geom, 0.01)), '
+    'geom_medium = ST_Multi(ST_SimplifyPreserveTopology(geom, 0.001)), '
+    'geom_high = ST_Multi(ST_SimplifyPreserveTopology(geom, 0.0001)) '
+    'WHERE geom IS NOT NULL')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0065_userreport_administrative_units'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='municipality',
+            name='geom_high',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='geom_low',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='geom_medium',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.RunSQL(SIMPLIFY_SQL, migrations.RunSQL.noop),
+    ]
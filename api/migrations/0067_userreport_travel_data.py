@@ -0,0 +1,72 @@
+# Generated by Django 2.2.10 on 2020-04-23 10:15
+
+import json
+
+import django.contrib.postgres.fields.jsonb
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def text(value):
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return value[:255]
+
+
+def parse_travel_history(apps, schema_editor):
+    UserReport = apps.get_model('api', 'UserReport')
+    last_id = 0
+    while True:
+        rows = list(UserReport.objects.filter(id__gt=last_id).order_by('id')
+                    .only('id', 'travel_history')[:BATCH_SIZE])
+        if not rows:
+            break
+        for row in rows:
+            try:
+                data = json.loads(row.travel_history)
+            except Exception:
+                data = {}
+            if not isinstance(data, dict):
+                data = {}
+            row.travel_data = data
+            row.country_name = text(data.get('country_name'))
+            row.flight_name = text(data.get('flight_name'))
+        UserReport.objects.bulk_update(
+            rows, ['travel_data', 'country_name', 'flight_name'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+    # every backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('api', '0066_municipality_simplified_geom'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userreport',
+            name='country_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='userreport',
+            name='flight_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='userreport',
+            name='travel_data',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(parse_travel_history, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='userreport',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['travel_data'], name='userreport_travel_gin'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.10 on 2020-04-24 09:20
+
+from django.db import migrations, models
+
+# Deactivating a snapshot used to overwrite its update_date with the moment
+# it was replaced, which is when its successor was recorded. So a row was
+# recorded when its predecessor was deactivated; the first row of every unit
+# only has its own update_date to go by.
+BACKFILL_SQL = (
+    'UPDATE "{table}" t SET recorded_date = r.recorded '
+    'FROM (SELECT id, COALESCE(LAG(update_date) OVER ('
+    'PARTITION BY "{unit}" ORDER BY id), update_date) AS recorded '
+    'FROM "{table}") r WHERE t.id = r.id')
+
+
+def backfill(table, unit):
+    return migrations.RunSQL(BACKFILL_SQL.format(table=table, unit=unit),
+                             migrations.RunSQL.noop)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0067_userreport_travel_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provincedata',
+            name='recorded_date',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='districtdata',
+            name='recorded_date',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='munidata',
+            name='recorded_date',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        backfill('api_provincedata', 'province_id_id'),
+        backfill('api_districtdata', 'district_id_id'),
+        backfill('api_munidata', 'municipality_id_id'),
+        migrations.AddIndex(
+            model_name='provincedata',
+            index=models.Index(fields=['province_id', 'recorded_date'], name='provincedata_unit_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='districtdata',
+            index=models.Index(fields=['district_id', 'recorded_date'], name='districtdata_unit_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='munidata',
+            index=models.Index(fields=['municipality_id', 'recorded_date'], name='munidata_unit_recorded_idx'),
+        ),
+        # the time series no longer reads update_date per unit
+        migrations.RemoveIndex(
+            model_name='provincedata',
+            name='provincedata_unit_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='districtdata',
+            name='districtdata_unit_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='munidata',
+            name='munidata_unit_date_idx',
+        ),
+    ]
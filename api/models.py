@@ -1,18 +1,27 @@
 import datetime
 import json
+from collections import OrderedDict
 from celery.result import AsyncResult
 from django.contrib.auth.models import Group
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.gis.db import models
-from django.contrib.gis.geos import Point
+from django.contrib.gis.geos import MultiPolygon, Point
 
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
-from django.db.models.signals import post_save
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
+from api.cache import bump_model_version
+from api.risk import parse_travel_history, score, travel_flags
+from api.spatial import cell_keys
 from api.utils import send_message
 
 
@@ -31,26 +40,90 @@ class MedicalFacilityType(models.Model):
         return self.name
 
 
-class Province(models.Model):
+class FacilityCounterMixin(object):
+    """
+    Facility counters denormalized onto an administrative unit.
+    `facility_category_count` maps category id to the number of facilities
+    of that category. Counters are adjusted by MedicalFacility writes.
+    """
+    facility_relation = None
+
+    @classmethod
+    def adjust_facility_count(cls, pk, category_id, used_for_corona_response,
+                              step):
+        if pk is None:
+            return
+        unit = cls.objects.select_for_update().filter(pk=pk).only(
+            'id', 'facility_category_count').first()
+        if unit is None:
+            return
+        counts = unit.facility_category_count or {}
+        key = str(category_id)
+        counts[key] = counts.get(key, 0) + step
+        if counts[key] <= 0:
+            del counts[key]
+        cls.objects.filter(pk=pk).update(
+            facility_count=F('facility_count') + step,
+            corona_facility_count=F('corona_facility_count') + (
+                step if used_for_corona_response else 0),
+            facility_category_count=counts)
+        # .update() sends no post_save, and the counters are served through
+        # cached responses and the municipalities tile layer
+        bump_model_version(cls)
+
+    @classmethod
+    def rebuild_facility_counters(cls):
+        rows = MedicalFacility.objects.values(
+            cls.facility_relation, 'category_id').annotate(
+            total=Count('id'),
+            corona=Count('id', filter=Q(used_for_corona_response=True)))
+        counters = {}
+        for row in rows:
+            count, corona, categories = counters.get(
+                row[cls.facility_relation], (0, 0, {}))
+            categories[str(row['category_id'])] = row['total']
+            counters[row[cls.facility_relation]] = (
+                count + row['total'], corona + row['corona'], categories)
+        units = list(cls.objects.only('id'))
+        for unit in units:
+            (unit.facility_count, unit.corona_facility_count,
+             unit.facility_category_count) = counters.get(unit.pk, (0, 0, {}))
+        cls.objects.bulk_update(units, [
+            'facility_count', 'corona_facility_count',
+            'facility_category_count'], batch_size=500)
+        bump_model_version(cls)
+
+
+class Province(FacilityCounterMixin, models.Model):
     province_id = models.CharField(max_length=300, null=True, blank=True)
     name = models.CharField(max_length=300, null=True, blank=True)
+    facility_count = models.IntegerField(default=0)
+    corona_facility_count = models.IntegerField(default=0)
+    facility_category_count = JSONField(default=dict, blank=True)
+
+    facility_relation = 'province'
 
     def __str__(self):
         return self.name
 
 
-class District(models.Model):
+class District(FacilityCounterMixin, models.Model):
     district_id = models.IntegerField(default=0, null=True, blank=True)
     name = models.CharField(max_length=300, null=True, blank=True)
     province = models.ForeignKey(Province, on_delete=models.CASCADE,
                                  related_name='districts',
                                  blank=True, null=True)
+    facility_count = models.IntegerField(default=0)
+    corona_facility_count = models.IntegerField(default=0)
+    facility_category_count = JSONField(default=dict, blank=True)
+
+    facility_relation = 'district'
 
     def __str__(self):
         return self.name
 
 
-class Municipality(models.Model):
+class Municipality(FacilityCounterMixin, models.Model):
     mun_id = models.CharField(max_length=255, null=True, blank=True)
 
     name = models.CharField(max_length=300, null=True, blank=True)
@@ -61,10 +134,40 @@ class Municipality(models.Model):
                                  related_name='municipalities',
                                  blank=True, null=True)
     geom = models.MultiPolygonField(srid=4326, blank=True, null=True)
+    facility_count = models.IntegerField(default=0)
+    corona_facility_count = models.IntegerField(default=0)
+    facility_category_count = JSONField(default=dict, blank=True)
+    geom_low = models.MultiPolygonField(srid=4326, null=True, editable=False,
+                                        spatial_index=False)
+    geom_medium = models.MultiPolygonField(srid=4326, null=True,
+                                           editable=False,
+                                           spatial_index=False)
+    geom_high = models.MultiPolygonField(srid=4326, null=True, editable=False,
+                                         spatial_index=False)
+
+    facility_relation = 'municipality'
+
+    # simplification tolerance in degrees of each geom_<detail> column
+    BOUNDARY_TOLERANCES = OrderedDict([
+        ('low', 0.01), ('medium', 0.001), ('high', 0.0001)])
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.simplify_boundaries()
+        super(Municipality, self).save(*args, **kwargs)
+
+    def simplify_boundaries(self):
+        for detail, tolerance in self.BOUNDARY_TOLERANCES.items():
+            simplified = None
+            if self.geom:
+                simplified = self.geom.simplify(tolerance,
+                                                preserve_topology=True)
+                if simplified.geom_type == 'Polygon':
+                    simplified = MultiPolygon(simplified, srid=self.geom.srid)
+            setattr(self, 'geom_' + detail, simplified)
+
 
 class MedicalFacility(models.Model):
     OWNERSHIP_CHOICES = (
@@ -122,7 +225,40 @@ class MedicalFacility(models.Model):
             self.long = self.location.x
         elif self.lat and self.long:
             self.location = Point(x=self.long, y=self.lat, srid=4326)
-        super(MedicalFacility, self).save(*args, **kwargs)
+        created = not self.pk
+        with transaction.atomic():
+            previous = None
+            if not created:
+                previous = MedicalFacility.objects.filter(
+                    pk=self.pk).values_list(*self.COUNTER_FIELDS).first()
+            super(MedicalFacility, self).save(*args, **kwargs)
+            current = self.counter_key()
+            if previous != current:
+                if previous:
+                    self.adjust_unit_counters(previous, -1)
+                self.adjust_unit_counters(current, 1)
+            NationalSummary.apply_delta(
+                {'facility_count': 1 if created else 0, 'facility_version': 1},
+                facility_updated=timezone.now())
+
+    COUNTER_FIELDS = ('province_id', 'district_id', 'municipality_id',
+                      'category_id', 'used_for_corona_response')
+
+    def counter_key(self):
+        return tuple(getattr(self, f) for f in self.COUNTER_FIELDS)
+
+    @staticmethod
+    def adjust_unit_counters(key, step):
+        province, district, municipality, category, corona = key
+        Province.adjust_facility_count(province, category, corona, step)
+        District.adjust_facility_count(district, category, corona, step)
+        Municipality.adjust_facility_count(municipality, category, corona,
+                                           step)
+
+    @staticmethod
+    def rebuild_unit_counters():
+        for unit_model in (Province, District, Municipality):
+            unit_model.rebuild_facility_counters()
 
 
 class ActiveManager(models.Manager):
@@ -130,7 +266,85 @@ class ActiveManager(models.Manager):
         return super().get_queryset().filter(active=True)
 
 
-class ProvinceData(models.Model):
+ROLLUP_FIELDS = (
+    'num_of_bed', 'num_of_icu_bed', 'occupied_icu_bed', 'num_of_ventilators',
+    'occupied_ventilators', 'num_of_isolation_bed', 'occupied_isolation_bed',
+    'total_samples_pending', 'in_quarantine', 'total_tested',
+    'total_positive', 'total_negative', 'total_recovered', 'total_death',
+    'total_in_isolation',
+)
+
+
+class SnapshotRollupMixin(object):
+    """
+    Keeps the active DistrictData / ProvinceData rows in step with
+    municipality snapshots when settings.SNAPSHOT_ROLLUP is on.
+    `deltas` maps a unit id to {field: change}. An active row recorded
+    today is updated in place; one from an earlier day keeps its point in
+    the time series and is succeeded by a new snapshot for today. Units
+    without an active snapshot get one built from their active MuniData.
+    """
+    rollup_unit_field = None
+
+    @classmethod
+    def apply_rollup(cls, deltas):
+        now = timezone.now()
+        today = timezone.localtime(now).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        applied = {f: 0 for f in ROLLUP_FIELDS}
+        for unit, changes in deltas.items():
+            changes = {f: d for f, d in changes.items() if d}
+            if unit is None or not changes:
+                continue
+            updated = cls._base_manager.filter(
+                active=True, recorded_date__gte=today,
+                **{cls.rollup_unit_field: unit}).update(
+                update_date=now, recorded_date=now,
+                **{f: Coalesce(F(f), 0) + d for f, d in changes.items()})
+            if not updated:
+                updated = cls.carry_forward(unit, changes, now)
+            if updated:
+                for f, d in changes.items():
+                    applied[f] += d
+            else:
+                cls.rollup_from_municipalities(unit)
+        bump_model_version(cls)
+        return applied
+
+    @classmethod
+    def carry_forward(cls, unit, changes, now):
+        """
+        Replaces the active snapshot of `unit` with a copy recorded now that
+        includes `changes`. Written with bulk_create, as the change is
+        already counted by the caller. False when there is no active row.
+        """
+        with transaction.atomic():
+            active = cls._base_manager.filter(
+                active=True, **{cls.rollup_unit_field: unit})
+            snapshot = active.select_for_update().order_by('-id').first()
+            if snapshot is None:
+                return False
+            active.update(active=False, update_date=now)
+            snapshot.pk = None
+            snapshot.recorded_date = None
+            for f, d in changes.items():
+                setattr(snapshot, f, (getattr(snapshot, f) or 0) + d)
+            cls._base_manager.bulk_create([snapshot])
+        return True
+
+    @classmethod
+    def rollup_from_municipalities(cls, unit):
+        totals = MuniData.objects.filter(
+            active=True, **{cls.rollup_unit_field: unit}).aggregate(
+            **{f: Sum(f) for f in ROLLUP_FIELDS})
+        snapshot = cls(hotline='', **{f: totals[f] or 0 for f in ROLLUP_FIELDS})
+        setattr(snapshot, cls._meta.get_field(
+            cls.rollup_unit_field).attname, unit)
+        snapshot.save()
+        return snapshot
+
+
+class ProvinceData(SnapshotRollupMixin, models.Model):
     province_id = models.ForeignKey(Province, on_delete=models.CASCADE, related_name='Province')
     total_samples_collected = models.IntegerField("Total No. of Samples "
                                                   "Collected (नमुना संकलन "
@@ -173,19 +387,127 @@ class ProvinceData(models.Model):
                                                  default=0)
     active = models.BooleanField(default=True)
     update_date = models.DateTimeField(auto_now=True, null=True, blank=True)
+    # when the snapshot was taken; unlike update_date it never changes
+    recorded_date = models.DateTimeField(auto_now_add=True, null=True)
     hotline = models.TextField()
     objects = ActiveManager()
 
-    def save(self, *args, **kwargs):
-        if not self.pk:
-            now = datetime.datetime.now()
-            province = self.province_id
-            ProvinceData.objects.filter(active=True, province_id=province).update(
-                active=False, update_date=now)
-        super().save(*args, **kwargs)
+    rollup_unit_field = 'province_id'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['province_id', 'recorded_date'],
+                         name='provincedata_unit_recorded_idx'),
+        ]
 
-class DistrictData(models.Model):
+    @classmethod
+    def apply_rollup(cls, deltas):
+        applied = super().apply_rollup(deltas)
+        NationalSummary.apply_delta(applied, update_date=timezone.now())
+        return applied
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if not self.pk:
+                now = datetime.datetime.now()
+                province = self.province_id
+                previous = ProvinceData.objects.filter(
+                    active=True, province_id=province)
+            else:
+                previous = ProvinceData.objects.filter(pk=self.pk, active=True)
+            old = previous.aggregate(
+                **{f: Sum(f) for f in NATIONAL_SUMMARY_FIELDS})
+            if not self.pk:
+                previous.update(active=False, update_date=now)
+            super().save(*args, **kwargs)
+            new = self.summary_values()
+            NationalSummary.apply_delta(
+                {f: new.get(f, 0) - (old[f] or 0)
+                 for f in NATIONAL_SUMMARY_FIELDS},
+                update_date=self.update_date)
+
+    def summary_values(self):
+        if not self.active:
+            return {}
+        return {f: getattr(self, f) or 0 for f in NATIONAL_SUMMARY_FIELDS}
+
+
+NATIONAL_SUMMARY_FIELDS = (
+    'total_samples_collected', 'total_tested', 'total_negative',
+    'total_in_isolation', 'total_positive', 'total_samples_pending',
+    'total_death', 'total_recovered', 'in_quarantine', 'num_of_bed',
+    'num_of_icu_bed', 'occupied_icu_bed', 'num_of_ventilators',
+    'occupied_ventilators', 'num_of_isolation_bed', 'occupied_isolation_bed',
+)
+
+
+class NationalSummary(models.Model):
+    """
+    Single row holding the national totals served by the `stats/` endpoint.
+    Kept current by applying deltas from ProvinceData and MedicalFacility
+    writes instead of aggregating on every request.
+    """
+    total_samples_collected = models.IntegerField(default=0)
+    total_tested = models.IntegerField(default=0)
+    total_negative = models.IntegerField(default=0)
+    total_in_isolation = models.IntegerField(default=0)
+    total_positive = models.IntegerField(default=0)
+    total_samples_pending = models.IntegerField(default=0)
+    total_death = models.IntegerField(default=0)
+    total_recovered = models.IntegerField(default=0)
+    in_quarantine = models.IntegerField(default=0)
+    num_of_bed = models.IntegerField(default=0)
+    num_of_icu_bed = models.IntegerField(default=0)
+    occupied_icu_bed = models.IntegerField(default=0)
+    num_of_ventilators = models.IntegerField(default=0)
+    occupied_ventilators = models.IntegerField(default=0)
+    num_of_isolation_bed = models.IntegerField(default=0)
+    occupied_isolation_bed = models.IntegerField(default=0)
+    facility_count = models.IntegerField(default=0)
+    update_date = models.DateTimeField(null=True, blank=True)
+    facility_version = models.IntegerField(default=0)
+    facility_updated = models.DateTimeField(null=True, blank=True)
+
+    SINGLETON_PK = 1
+
+    @classmethod
+    def get_solo(cls):
+        summary = cls.objects.filter(pk=cls.SINGLETON_PK).first()
+        if summary is None:
+            summary = cls.rebuild()
+        return summary
+
+    @classmethod
+    def apply_delta(cls, deltas, **values):
+        updates = {f: F(f) + d for f, d in deltas.items() if d}
+        updates.update({f: v for f, v in values.items() if v is not None})
+        if not updates:
+            return
+        if not cls.objects.filter(pk=cls.SINGLETON_PK).update(**updates):
+            cls.rebuild()
+            return
+        bump_model_version(cls)
+
+    @classmethod
+    def rebuild(cls):
+        totals = ProvinceData.objects.filter(active=True).aggregate(
+            update_date=Max('update_date'),
+            **{f: Sum(f) for f in NATIONAL_SUMMARY_FIELDS})
+        values = {f: totals[f] or 0 for f in NATIONAL_SUMMARY_FIELDS}
+        values['update_date'] = totals['update_date']
+        values['facility_count'] = MedicalFacility.objects.count()
+        values['facility_updated'] = timezone.now()
+        with transaction.atomic():
+            summary = cls.objects.select_for_update().filter(
+                pk=cls.SINGLETON_PK).first() or cls(pk=cls.SINGLETON_PK)
+            for field, value in values.items():
+                setattr(summary, field, value)
+            summary.facility_version += 1
+            summary.save()
+        return summary
+
+
+class DistrictData(SnapshotRollupMixin, models.Model):
     province_id = models.ForeignKey(Province, on_delete=models.CASCADE,
                                     related_name='district_data', null=True, blank=True)
     district_id = models.ForeignKey(District, on_delete=models.CASCADE,
@@ -213,8 +535,17 @@ class DistrictData(models.Model):
     total_in_isolation = models.IntegerField(null=True, blank=True, default=0)
     active = models.BooleanField(default=True)
     update_date = models.DateTimeField(auto_now=True, null=True, blank=True)
+    recorded_date = models.DateTimeField(auto_now_add=True, null=True)
     hotline = models.TextField()
 
+    rollup_unit_field = 'district_id'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['district_id', 'recorded_date'],
+                         name='districtdata_unit_recorded_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.pk:
             now = datetime.datetime.now()
@@ -257,21 +588,44 @@ class MuniData(models.Model):
     total_in_isolation = models.IntegerField(null=True, blank=True, default=0)
     active = models.BooleanField(default=True)
     update_date = models.DateTimeField(auto_now=True, null=True, blank=True)
+    recorded_date = models.DateTimeField(auto_now_add=True, null=True)
     hotline = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['municipality_id', 'recorded_date'],
+                         name='munidata_unit_recorded_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if not self.pk:
-            now = datetime.datetime.now()
-            munc = self.municipality_id
-            MuniData.objects.filter(active=True,
-                                        municipality_id=munc).update(
-                active=False, update_date=now)
-            if self.municipality_id.district:
-                self.district_id = self.municipality_id.district
-            if self.municipality_id.province:
-                self.province_id = self.district_id.province
+        with transaction.atomic():
+            if not self.pk:
+                now = datetime.datetime.now()
+                munc = self.municipality_id
+                previous = MuniData.objects.filter(active=True,
+                                                   municipality_id=munc)
+                old = previous.aggregate(**{f: Sum(f) for f in ROLLUP_FIELDS})
+                previous.update(active=False, update_date=now)
+                if self.municipality_id.district:
+                    self.district_id = self.municipality_id.district
+                if self.municipality_id.province:
+                    self.province_id = self.district_id.province
+            else:
+                old = MuniData.objects.filter(pk=self.pk, active=True).aggregate(
+                    **{f: Sum(f) for f in ROLLUP_FIELDS})
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+            if settings.SNAPSHOT_ROLLUP:
+                new = self.rollup_values()
+                delta = {f: new.get(f, 0) - (old[f] or 0)
+                         for f in ROLLUP_FIELDS}
+                DistrictData.apply_rollup({self.district_id_id: delta})
+                ProvinceData.apply_rollup({self.province_id_id: delta})
+
+    def rollup_values(self):
+        if not self.active:
+            return {}
+        return {f: getattr(self, f) or 0 for f in ROLLUP_FIELDS}
 
 
 class CovidCases(models.Model):
@@ -315,7 +669,26 @@ class UserRole(models.Model):
                                  blank=True, null=True)
 
 
-class UserLocation(models.Model):
+def travel_text(value):
+    if value is None:
+        return ''
+    text = value if isinstance(value, str) else json.dumps(
+        value, ensure_ascii=False)
+    return text[:255]
+
+
+class SpatialCellMixin(object):
+    """
+    Keeps the quadkey cell columns (see `cell_keys`) in step with `location`,
+    so density queries group by an indexed integer instead of geometry.
+    """
+
+    def assign_spatial_cells(self):
+        for field, key in cell_keys(self.location).items():
+            setattr(self, field, key)
+
+
+class UserLocation(SpatialCellMixin, models.Model):
     update_date = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="location",
                              on_delete=models.CASCADE)
@@ -323,6 +696,16 @@ class UserLocation(models.Model):
     location = models.PointField(srid=4326, blank=True, null=True)
     lat = models.FloatField(null=True, blank=True, default=27)
     long = models.FloatField(null=True, blank=True, default=85)
+    cell_z8 = models.IntegerField(null=True, editable=False, db_index=True)
+    cell_z12 = models.IntegerField(null=True, editable=False, db_index=True)
+    cell_z16 = models.BigIntegerField(null=True, editable=False,
+                                      db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['update_date', 'id'],
+                         name='userlocation_keyset_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -333,6 +716,7 @@ class UserLocation(models.Model):
             self.long = self.location.x
         elif self.lat and self.long:
             self.location = Point(x=self.long, y=self.lat, srid=4326)
+        self.assign_spatial_cells()
         super(UserLocation, self).save(*args, **kwargs)
 
 
@@ -355,7 +739,7 @@ class AgeGroupData(models.Model):
     ltotal = models.IntegerField(default=0)
 
 
-class UserReport(models.Model):
+class UserReport(SpatialCellMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="report",
                              blank=True, null=True, on_delete=models.SET_NULL)
     device_id = models.CharField(max_length=63, blank=True, null=True)
@@ -383,41 +767,131 @@ class UserReport(models.Model):
     long = models.FloatField(null=True, blank=True, default=85)
     update_date = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     result = models.CharField(max_length=255, default="lesslikely")
+    cell_z8 = models.IntegerField(null=True, editable=False, db_index=True)
+    cell_z12 = models.IntegerField(null=True, editable=False, db_index=True)
+    cell_z16 = models.BigIntegerField(null=True, editable=False,
+                                      db_index=True)
+    province = models.ForeignKey(Province, on_delete=models.SET_NULL,
+                                 related_name='reports', null=True,
+                                 editable=False)
+    district = models.ForeignKey(District, on_delete=models.SET_NULL,
+                                 related_name='reports', null=True,
+                                 editable=False)
+    municipality = models.ForeignKey(Municipality, on_delete=models.SET_NULL,
+                                     related_name='reports', null=True,
+                                     editable=False)
+    travel_data = JSONField(default=dict, blank=True, editable=False)
+    country_name = models.CharField(max_length=255, blank=True, default='',
+                                    editable=False, db_index=True)
+    flight_name = models.CharField(max_length=255, blank=True, default='',
+                                   editable=False, db_index=True)
 
     class Meta:
         ordering = ['-update_date']
+        indexes = [
+            models.Index(fields=['update_date', 'id'],
+                         name='userreport_keyset_idx'),
+            GinIndex(fields=['travel_data'], name='userreport_travel_gin'),
+        ]
 
     def save(self, *args, **kwargs):
+        self.assign_derived_fields()
+        super(UserReport, self).save(*args, **kwargs)
+
+    def assign_derived_fields(self, administrative_units=True):
+        """
+        Everything save() computes from the submitted values: location,
+        spatial cells, administrative units, travel flags and the result.
+        Buffered reports skip the units and get them in bulk on flush.
+        """
         if self.location:
             self.lat = self.location.y
             self.long = self.location.x
         elif self.lat and self.long:
             self.location = Point(x=self.long, y=self.lat, srid=4326)
-        travel_history = self.travel_history
-        try:
-            data = json.loads(travel_history)
-            if not isinstance(data, dict):
-                data = {}
-        except Exception:
-            data = {}
-        has_travel_history = data.get('has_travel_history', False)
-        has_covid_contact = data.get('has_covid_contact', False)
-        has_convid_contact = data.get('has_convid_contact', False)
-        if not has_covid_contact and has_convid_contact:
-            has_covid_contact = has_convid_contact
-        self.has_convid_contact = has_covid_contact
-        self.has_travel_history = has_travel_history
+        self.assign_spatial_cells()
+        if administrative_units:
+            self.assign_administrative_units()
+        self.assign_travel_fields()
         self.result = self.get_result
-        super(UserReport, self).save(*args, **kwargs)
+
+    def assign_travel_fields(self):
+        """
+        Parses travel_history once into travel_data and the columns read
+        by filters, exports and the risk rules.
+        """
+        data = parse_travel_history(self.travel_history)
+        self.travel_data = data
+        self.country_name = travel_text(data.get('country_name'))
+        self.flight_name = travel_text(data.get('flight_name'))
+        self.has_travel_history, self.has_convid_contact = travel_flags(data)
+
+    def assign_administrative_units(self):
+        """
+        Sets the municipality, district and province whose boundary
+        contains the report's location.
+        """
+        unit = None
+        if self.location:
+            unit = Municipality.objects.filter(
+                geom__contains=self.location).values_list(
+                'id', 'district_id', 'province_id').first()
+        self.municipality_id, self.district_id, self.province_id = \
+            unit or (None, None, None)
+
+    ADMINISTRATIVE_UNITS_SQL = (
+        'UPDATE "api_userreport" r SET municipality_id = m.id, '
+        'district_id = m.district_id, province_id = m.province_id '
+        'FROM "api_municipality" m '
+        'WHERE r.id >= %s AND r.id < %s AND r.location IS NOT NULL '
+        'AND r.municipality_id IS NULL AND m.geom && r.location '
+        'AND ST_Contains(m.geom, r.location)')
+    CLEAR_ADMINISTRATIVE_UNITS_SQL = (
+        'UPDATE "api_userreport" SET municipality_id = NULL, '
+        'district_id = NULL, province_id = NULL '
+        'WHERE id >= %s AND id < %s AND municipality_id IS NOT NULL')
+
+    @classmethod
+    def assign_administrative_units_in_range(cls, start, end,
+                                             reassign=False):
+        """
+        One spatial join assigning every unassigned report with
+        start <= id < end to its municipality. With `reassign` the units of
+        the range are cleared first, for reports whose location changed.
+        Returns the rows updated.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            if reassign:
+                cursor.execute(cls.CLEAR_ADMINISTRATIVE_UNITS_SQL,
+                               [start, end])
+            cursor.execute(cls.ADMINISTRATIVE_UNITS_SQL, [start, end])
+            return cursor.rowcount
 
     @property
     def get_result(self):
-        if self.has_travel_history or self.has_convid_contact:
-            if self.temperature >= 102:
-                return "morelikely"
-            elif self.temperature >= 99:
-                return "likely"
-        return "lesslikely"
+        return score(self.temperature, self.has_travel_history,
+                     self.has_convid_contact)
+
+
+@receiver(post_delete, sender=ProvinceData)
+def remove_province_data_from_summary(sender, instance=None, **kwargs):
+    values = instance.summary_values()
+    if values:
+        NationalSummary.apply_delta({f: -v for f, v in values.items()})
+
+
+@receiver(post_delete, sender=MedicalFacility)
+def remove_facility_from_counters(sender, instance=None, **kwargs):
+    instance.adjust_unit_counters(instance.counter_key(), -1)
+    NationalSummary.apply_delta({'facility_count': -1, 'facility_version': 1},
+                                facility_updated=timezone.now())
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_response_cache(sender, **kwargs):
+    if sender._meta.app_label == 'api':
+        bump_model_version(sender)
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
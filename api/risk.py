@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+
+# Rules are checked in order and the first match wins. A rule matches when
+# the person reported travel or contact with a case and their temperature
+# (°F) is at least `temperature`.
+RISK_RULES = (
+    {'result': 'morelikely', 'temperature': 102},
+    {'result': 'likely', 'temperature': 99},
+)
+DEFAULT_RESULT = 'lesslikely'
+
+LESS_LIKELY_MESSAGE = (
+    "प्रारम्भिक परिक्षणमा तपाईले बुझाउनु भएका शारीरिक लक्षण वा "
+    "यात्रा विवरणका आधारमा तपाइँलाई कोभीड-१९ को संक्रमण हुने"
+    " सम्भावन कम देखिन्छ। यद्यपि परिक्षणबिना संक्रमण भए नभएको "
+    "थाहा नहुने हुनाले सकेसम्म हुलमुलमा नगई बाह्य सम्पर्क कम गरि "
+    "संक्रमण फैलिन नदिन सहयोग गर्नुहोस्। तपाइलाई संका भएमा थप "
+    "परिक्षण गर्नको निम्ति निम्न सम्पर्क नम्बर वा नजिकको कोभिड-१९ "
+    "सम्बन्धि सेवाका लागी नेपाल सरकारद्वारा तोकिएको स्वास्थ्य संस्थामा सम्पर्क गर्नुहोस्।")
+
+LIKELY_MESSAGE = (
+    "प्रारम्भिक परिक्षणमा तपाईले बुझाउनु भएका लक्षण वा यात्रा विवरणका "
+    "आधारमा तपाईँलाई कोभीड-१९ को संक्रमण भएको हुनसक्ने देखिन्छ। "
+    "कृपया कोभिड-१९ को थप परिक्षण गर्नको निम्ति निम्न सम्पर्क नम्बर वा"
+    " नजिकको कोभिड-१९ सम्बन्धि सेवाका लागी नेपाल सरकारद्वारा तोकिएको "
+    "स्वास्थ्य संस्थामा सम्पर्क गर्नुहोस्। त्यतिन्जेल सेल्फ क्वारेन्टाइनमा बस्नुहोस् र"
+    " अन्य व्यक्तिहरुसँग सम्पर्क नगरि कोरोना संक्रमण फैलन नदिन सहयोग गर्नुहोस्।")
+
+RISK_MESSAGES = {
+    'morelikely': LIKELY_MESSAGE,
+    'likely': LIKELY_MESSAGE,
+    'lesslikely': LESS_LIKELY_MESSAGE,
+}
+
+
+def parse_travel_history(travel_history):
+    """
+    The travel_history json sent by the apps as a dict, {} when it is
+    missing or not an object.
+    """
+    try:
+        data = json.loads(travel_history)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def travel_flags(data):
+    """
+    (has_travel_history, has_covid_contact) from parsed travel_history,
+    which older apps send with the `has_convid_contact` spelling.
+    """
+    has_covid_contact = data.get('has_covid_contact', False)
+    has_convid_contact = data.get('has_convid_contact', False)
+    if not has_covid_contact and has_convid_contact:
+        has_covid_contact = has_convid_contact
+    return data.get('has_travel_history', False), has_covid_contact
+
+
+def score(temperature, has_travel_history, has_covid_contact):
+    """
+    The result for one report.
+    """
+    if has_travel_history or has_covid_contact:
+        for rule in RISK_RULES:
+            if temperature >= rule['temperature']:
+                return rule['result']
+    return DEFAULT_RESULT
+
+
+def risk_message(report):
+    """
+    (message, result) shown for a scored report.
+    """
+    return RISK_MESSAGES[report.result], report.result
+
+
+def score_batch(temperature, has_travel_history, has_covid_contact):
+    """
+    Vectorised `score` over equally long arrays or pandas Series, evaluated
+    in one pass with numpy; returns an array of results.
+    """
+    temperature = np.nan_to_num(np.asarray(temperature, dtype=float))
+    exposed = np.asarray(has_travel_history, dtype=bool) | \
+        np.asarray(has_covid_contact, dtype=bool)
+    return np.select(
+        [exposed & (temperature >= rule['temperature'])
+         for rule in RISK_RULES],
+        [rule['result'] for rule in RISK_RULES], default=DEFAULT_RESULT)
+
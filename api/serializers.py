@@ -5,10 +5,51 @@ from .models import MedicalFacility, MedicalFacilityCategory, \
     MedicalFacilityType, CovidCases, Province, ProvinceData, District, \
     Municipality, UserRole, UserLocation, UserReport, AgeGroupData, \
     DistrictData, MuniData, GlobalData, MobileVersion, Device, SuspectReport, \
-    ApplicationStat, FAQ, News
-
-
-class MedicalFacilityCategorySerializer(serializers.ModelSerializer):
+    ApplicationStat, FAQ, News, NationalSummary
+
+SPARSE_METHODS = ('GET', 'HEAD')
+
+
+def has_sparse_fieldset(request):
+    return request.method in SPARSE_METHODS and bool(
+        request.query_params.get('fields') or
+        request.query_params.get('omit'))
+
+
+def sparse_field_names(request, names):
+    """
+    The subset of `names` kept by the request's `?fields=` (comma separated
+    names to keep) and `?omit=` (names to drop).
+    """
+    params = request.query_params
+    selected = None
+    if params.get('fields'):
+        selected = {name.strip() for name in params['fields'].split(',')}
+    omitted = {name.strip() for name in params.get('omit', '').split(',')}
+    return [name for name in names
+            if (selected is None or name in selected) and
+            name not in omitted]
+
+
+class SparseFieldsetMixin(object):
+    """
+    Narrows the serializer to the fields chosen with `?fields=` / `?omit=`
+    on the request in its context. Writes always see every field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsetMixin, self).__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or not hasattr(request, 'query_params') or \
+                not has_sparse_fieldset(request):
+            return
+        kept = set(sparse_field_names(request, self.fields))
+        for name in list(self.fields):
+            if name not in kept:
+                self.fields.pop(name)
+
+
+class MedicalFacilityCategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     type = serializers.SerializerMethodField()
 
     class Meta:
@@ -16,17 +57,17 @@ class MedicalFacilityCategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'type')
 
     def get_type(self, obj):
-        qs = obj.Category.all().order_by('id').values('id', 'name')
-        return qs
+        types = sorted(obj.Category.all(), key=lambda t: t.id)
+        return [{'id': t.id, 'name': t.name} for t in types]
 
 
-class MedicalFacilityTypeSerializer(serializers.ModelSerializer):
+class MedicalFacilityTypeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = MedicalFacilityType
         fields = "__all__"
 
 
-class MedicalFacilitySerializer(serializers.ModelSerializer):
+class MedicalFacilitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     ownership_display = serializers.CharField(source="get_ownership_display",
                                            read_only=True)
     district_name = serializers.SerializerMethodField()
@@ -73,32 +114,119 @@ class MedicalFacilitySerializer(serializers.ModelSerializer):
         return 0
 
 
-class CaseSerializer(serializers.ModelSerializer):
+class MedicalFacilityValuesSerializer(object):
+    """
+    Read-only fast path for MedicalFacility lists. Rows are fetched with
+    values(), the joined names included, and mapped to the exact output of
+    MedicalFacilitySerializer through a field mapping compiled once, so no
+    model instances or per-row field machinery are involved.
+    """
+    serializer_class = MedicalFacilitySerializer
+    related_names = {
+        'district_name': 'district',
+        'province_name': 'province',
+        'municipality_name': 'municipality',
+        'category_name': 'category',
+        'type_name': 'type',
+    }
+
+    def __init__(self):
+        self._columns = None
+
+    def compile(self):
+        choices = dict(MedicalFacility.OWNERSHIP_CHOICES)
+        columns = []
+        for name, field in self.serializer_class().fields.items():
+            if name in self.related_names:
+                relation = self.related_names[name]
+                columns.append((name, [relation, relation + '__name'],
+                                self._related_name(relation)))
+            elif name == 'distance':
+                columns.append((name, [], lambda row: row.get('distance', 0)))
+            elif name == 'ownership_display':
+                columns.append((name, ['ownership'], lambda row: choices.get(
+                    row['ownership'], row['ownership'])))
+            elif isinstance(field, serializers.ModelField):
+                columns.append((name, [name], self._model_field(name)))
+            elif isinstance(field, serializers.RelatedField):
+                columns.append((name, [name], self._plain(name)))
+            else:
+                columns.append((name, [field.source], self._converted(
+                    field.source, field.to_representation)))
+        self._columns = columns
+
+    @staticmethod
+    def _related_name(relation):
+        name = relation + '__name'
+        return lambda row: "" if row[relation] is None else row[name]
+
+    @staticmethod
+    def _model_field(key):
+        return lambda row: None if row[key] is None else str(row[key])
+
+    @staticmethod
+    def _plain(key):
+        return lambda row: row[key]
+
+    @staticmethod
+    def _converted(key, convert):
+        return lambda row: None if row[key] is None else convert(row[key])
+
+    def columns(self, names=None):
+        """
+        The compiled columns, limited to `names` when given.
+        """
+        if self._columns is None:
+            self.compile()
+        if names is None:
+            return self._columns
+        names = set(names)
+        return [column for column in self._columns if column[0] in names]
+
+    def values(self, queryset, names=None):
+        lookups = [lookup for _, column_lookups, _ in self.columns(names)
+                   for lookup in column_lookups]
+        return queryset.values(*dict.fromkeys(lookups or ['id']))
+
+    def to_representation(self, rows, names=None):
+        columns = [(name, get) for name, _, get in self.columns(names)]
+        return [{name: get(row) for name, get in columns} for row in rows]
+
+
+class CaseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = CovidCases
         fields = "__all__"
 
 
-class ProvinceSerializer(serializers.ModelSerializer):
+class ProvinceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Province
         fields = "__all__"
 
 
-class DistrictSerializer(serializers.ModelSerializer):
+class DistrictSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = District
         fields = "__all__"
 
 
-class MunicipalitySerializer(serializers.ModelSerializer):
+class MunicipalitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Municipality
-        fields = "__all__"
+        exclude = ('geom_low', 'geom_medium', 'geom_high')
+
+
+class MunicipalityListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Municipality
+        exclude = ('geom', 'geom_low', 'geom_medium', 'geom_high')
 
 
-class ProvinceDataSerializer(serializers.ModelSerializer):
+class ProvinceDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     facility_count = serializers.SerializerMethodField()
+    corona_facility_count = serializers.SerializerMethodField()
+    facility_category_count = serializers.SerializerMethodField()
     province_name = serializers.SerializerMethodField()
 
     class Meta:
@@ -108,13 +236,40 @@ class ProvinceDataSerializer(serializers.ModelSerializer):
     def get_facility_count(self, obj):
         if hasattr(obj, "facility_count"):
             return obj.facility_count
-        return MedicalFacility.objects.filter(province=obj.province_id).count()
+        return obj.province_id.facility_count
+
+    def get_corona_facility_count(self, obj):
+        return obj.province_id.corona_facility_count
+
+    def get_facility_category_count(self, obj):
+        return obj.province_id.facility_category_count
 
     def get_province_name(self, obj):
         return obj.province_id.name
 
 
-class UserRoleSerializer(serializers.ModelSerializer):
+class NationalSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    tested = serializers.IntegerField(source='total_tested')
+    confirmed = serializers.IntegerField(source='total_positive')
+    isolation = serializers.IntegerField(source='total_in_isolation')
+    death = serializers.IntegerField(source='total_death')
+    icu = serializers.IntegerField(source='num_of_icu_bed')
+    occupied_icu = serializers.IntegerField(source='occupied_icu_bed')
+    ventilator = serializers.IntegerField(source='num_of_ventilators')
+    occupied_ventilator = serializers.IntegerField(
+        source='occupied_ventilators')
+    isolation_bed = serializers.IntegerField(source='num_of_isolation_bed')
+
+    class Meta:
+        model = NationalSummary
+        fields = ('tested', 'total_samples_collected', 'total_samples_pending',
+                  'total_negative', 'update_date', 'confirmed', 'isolation',
+                  'total_recovered', 'death', 'icu', 'occupied_icu',
+                  'ventilator', 'occupied_ventilator', 'isolation_bed',
+                  'occupied_isolation_bed', 'facility_count')
+
+
+class UserRoleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     group_name = serializers.SerializerMethodField()
     facility_name = serializers.SerializerMethodField()
     province_name = serializers.SerializerMethodField()
@@ -140,17 +295,23 @@ class UserRoleSerializer(serializers.ModelSerializer):
         return ""
 
 
-class UserLocationSerializer(serializers.ModelSerializer):
+class UserLocationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = UserLocation
         fields = "__all__"
 
 
-class UserReportSerializer(serializers.ModelSerializer):
+# columns UserReport derives from travel_history and location for filters
+# and exports; they would repeat travel_history on every row
+USER_REPORT_DERIVED_FIELDS = ('travel_data', 'country_name', 'flight_name',
+                              'cell_z8', 'cell_z12', 'cell_z16')
+
+
+class UserReportSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = UserReport
-        fields = "__all__"
+        exclude = USER_REPORT_DERIVED_FIELDS
 
     def validate(self, data):
         """
@@ -167,20 +328,20 @@ class UserReportSerializer(serializers.ModelSerializer):
         return exclusions + ['lat', 'long', 'name', 'contact_no']
 
 
-class SmallUserReportSerializer(serializers.ModelSerializer):
+class SmallUserReportSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = UserReport
         fields = ('id', 'lat', 'long', 'update_date', 'result')
 
 
-class AgeGroupDataSerializer(serializers.ModelSerializer):
+class AgeGroupDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = AgeGroupData
         fields = "__all__"
 
 
-class SpaceSerializer(serializers.ModelSerializer):
+class SpaceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     distance = serializers.SerializerMethodField()
 
     class Meta:
@@ -192,20 +353,22 @@ class SpaceSerializer(serializers.ModelSerializer):
         return str("{0:.3f}".format(a)) + 'km'
 
 
-class NearUserSerializer(serializers.ModelSerializer):
+class NearUserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     distance = serializers.SerializerMethodField()
 
     class Meta:
         model = UserReport
-        exclude = ('travel_history',)
+        exclude = ('travel_history',) + USER_REPORT_DERIVED_FIELDS
 
     def get_distance(self, obj):
         a = float(''.join([x for x in str(obj.distance) if x != 'm']).strip()) / 1000
         return str("{0:.3f}".format(a)) + 'km'
 
 
-class DistrictDataSerializer(serializers.ModelSerializer):
+class DistrictDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     facility_count = serializers.SerializerMethodField()
+    corona_facility_count = serializers.SerializerMethodField()
+    facility_category_count = serializers.SerializerMethodField()
 
     class Meta:
         model = DistrictData
@@ -214,11 +377,19 @@ class DistrictDataSerializer(serializers.ModelSerializer):
     def get_facility_count(self, obj):
         if hasattr(obj, "facility_count"):
             return obj.facility_count
-        return MedicalFacility.objects.filter(district=obj.district_id).count()
+        return obj.district_id.facility_count
+
+    def get_corona_facility_count(self, obj):
+        return obj.district_id.corona_facility_count
 
+    def get_facility_category_count(self, obj):
+        return obj.district_id.facility_category_count
 
-class MuncDataSerializer(serializers.ModelSerializer):
+
+class MuncDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     facility_count = serializers.SerializerMethodField()
+    corona_facility_count = serializers.SerializerMethodField()
+    facility_category_count = serializers.SerializerMethodField()
 
     class Meta:
         model = MuniData
@@ -227,32 +398,37 @@ class MuncDataSerializer(serializers.ModelSerializer):
     def get_facility_count(self, obj):
         if hasattr(obj, "facility_count"):
             return obj.facility_count
-        return MedicalFacility.objects.filter(
-            municipality=obj.municipality_id).count()
+        return obj.municipality_id.facility_count
+
+    def get_corona_facility_count(self, obj):
+        return obj.municipality_id.corona_facility_count
+
+    def get_facility_category_count(self, obj):
+        return obj.municipality_id.facility_category_count
 
 
-class GlobalDataSerializer(serializers.ModelSerializer):
+class GlobalDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = GlobalData
         fields = "__all__"
 
 
-class ApplicationDataSerializer(serializers.ModelSerializer):
+class ApplicationDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = ApplicationStat
         fields = "__all__"
         
 
-class FAQSerializer(serializers.ModelSerializer):
+class FAQSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = FAQ
         fields = "__all__"
 
 
-class NewsSerializer(serializers.ModelSerializer):
+class NewsSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = News
@@ -261,28 +437,28 @@ class NewsSerializer(serializers.ModelSerializer):
 
 
 
-class MobileVersionSerializer(serializers.ModelSerializer):
+class MobileVersionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = MobileVersion
         fields = "__all__"
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = User
         fields = "__all__"
 
 
-class DeviceSerializer(serializers.ModelSerializer):
+class DeviceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Device
         fields = "__all__"
 
 
-class SuspectSerializer(serializers.ModelSerializer):
+class SuspectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
 
     class Meta:
         model = SuspectReport
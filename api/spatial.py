@@ -0,0 +1,221 @@
+import math
+import time
+
+from django.contrib.gis.db.models.functions import Distance
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from api.cache import current_model_versions
+
+# zoom levels of the quadkey cells stored on reports and location pings
+CELL_ZOOMS = (8, 12, 16)
+MERCATOR_MAX_LATITUDE = 85.05112878
+
+# the polar radius, the smallest the earth has: metres per radian of a
+# great circle are at least this many
+EARTH_MIN_RADIUS = 6356752.0
+
+
+def mercator_tile(longitude, latitude, z):
+    """
+    x, y of the web mercator (slippy map) tile holding the point at zoom `z`.
+    """
+    latitude = max(min(latitude, MERCATOR_MAX_LATITUDE),
+                   -MERCATOR_MAX_LATITUDE)
+    n = 2 ** z
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi)
+            / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def quadkey(longitude, latitude, z):
+    """
+    The quadkey of the point's tile at zoom `z` as an integer: two bits per
+    zoom level, so the cell at a coarser zoom `p` is `key >> 2 * (z - p)`.
+    """
+    x, y = mercator_tile(longitude, latitude, z)
+    key = 0
+    for bit in range(z - 1, -1, -1):
+        key = (key << 2) | (((y >> bit) & 1) << 1) | ((x >> bit) & 1)
+    return key
+
+
+def quadkey_bounds(key, z):
+    """
+    (xmin, ymin, xmax, ymax) in degrees of the cell `key` at zoom `z`.
+    """
+    x = y = 0
+    for bit in range(z):
+        x |= ((key >> (2 * bit)) & 1) << bit
+        y |= ((key >> (2 * bit + 1)) & 1) << bit
+    n = 2 ** z
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (x / n * 360.0 - 180.0, latitude(y + 1),
+            (x + 1) / n * 360.0 - 180.0, latitude(y))
+
+
+def cell_keys(point):
+    """
+    {'cell_z8': ..., 'cell_z12': ..., 'cell_z16': ...} for a point, or
+    Nones when there is no point.
+    """
+    return {'cell_z{}'.format(z): quadkey(point.x, point.y, z)
+            if point else None for z in CELL_ZOOMS}
+
+
+def knn_order(queryset, point, field='location'):
+    """
+    Orders `queryset` by the PostGIS `<->` operator, which walks the GiST
+    index on `field` nearest-first instead of measuring every row.
+    """
+    model = queryset.model
+    column = '"{}"."{}"'.format(model._meta.db_table,
+                                model._meta.get_field(field).column)
+    return queryset.order_by(RawSQL(
+        '{} <-> ST_SetSRID(ST_MakePoint(%s, %s), %s)'.format(column),
+        (point.x, point.y, point.srid)).asc())
+
+
+def degree_bound(point, meters):
+    """
+    Planar distance in degrees that every point within `meters` of `point`
+    on the ground stays inside: a degree of longitude shrinks with the
+    cosine of the latitude, so the bound uses the highest latitude the
+    circle reaches.
+    """
+    radians = meters / EARTH_MIN_RADIUS
+    latitude = min(abs(point.y) + math.degrees(radians), 89.0)
+    return math.degrees(radians) / math.cos(math.radians(latitude))
+
+
+def nearest(queryset, point, k, field='location', max_distance=None):
+    """
+    The `k` rows of `queryset` closest to `point`, annotated with `distance`.
+    `<->` compares planar degrees, which is not the ground distance away
+    from the equator, so it only finds `k` candidates through the index.
+    The farthest of them bounds the answer: every row that can be closer
+    lies within `degree_bound` of that distance, and those rows are read
+    with one more index-assisted query and sorted by their true distance.
+    `max_distance` is a `D` measure.
+    """
+    annotated = queryset.annotate(distance=Distance(field, point))
+    candidates = list(knn_order(annotated, point, field)[:k])
+    if not candidates:
+        return []
+    reach = max(row.distance.m for row in candidates)
+    if max_distance is not None:
+        reach = min(reach, max_distance.m)
+    rows = list(annotated.filter(**{
+        field + '__dwithin': (point, degree_bound(point, reach))}
+    ).order_by('distance')[:k])
+    if max_distance is not None:
+        rows = [row for row in rows if row.distance <= max_distance]
+    return rows
+
+
+CLUSTER_CELLS = 4  # grid cells per tile side
+CLUSTER_MAX_ZOOM = 14  # from this zoom on reports are sent one by one
+CLUSTER_MAX_TILES = 64
+# cluster tiles are reused for this many seconds; reports arrive far more
+# often than that, so keying tiles on the model version would never hit
+CLUSTER_CACHE_TIMEOUT = 5 * 60
+
+CLUSTER_SQL = (
+    'SELECT count(*), ST_X(ST_Centroid(ST_Collect(location))), '
+    'ST_Y(ST_Centroid(ST_Collect(location))) FROM "{table}" '
+    'WHERE location && ST_MakeEnvelope(%s, %s, %s, %s, 4326) '
+    'AND ST_X(location) >= %s AND ST_X(location) < %s '
+    'AND ST_Y(location) >= %s AND ST_Y(location) < %s AND result = %s '
+    'GROUP BY ST_SnapToGrid(location, %s, %s, %s, %s)')
+POINT_SQL = (
+    'SELECT id, ST_X(location), ST_Y(location) FROM "{table}" '
+    'WHERE location && ST_MakeEnvelope(%s, %s, %s, %s, 4326) '
+    'AND ST_X(location) >= %s AND ST_X(location) < %s '
+    'AND ST_Y(location) >= %s AND ST_Y(location) < %s AND result = %s')
+
+
+def grid_tile_bounds(z, x, y):
+    """
+    Bounds of tile z/x/y on a plain longitude/latitude grid whose tiles are
+    360 / 2 ** z degrees wide and tall.
+    """
+    size = 360.0 / 2 ** z
+    return (-180 + x * size, -90 + y * size,
+            -180 + (x + 1) * size, -90 + (y + 1) * size)
+
+
+def grid_tiles(z, bbox):
+    """
+    (x, y) of every grid tile at zoom `z` intersecting `bbox`.
+    """
+    size = 360.0 / 2 ** z
+    columns = 2 ** z
+    rows = max(columns // 2, 1)
+
+    def clamp(value, upper):
+        return min(max(int(value), 0), upper - 1)
+
+    xmin, ymin, xmax, ymax = bbox
+    return [(x, y)
+            for x in range(clamp((xmin + 180) // size, columns),
+                           clamp((xmax + 180) // size, columns) + 1)
+            for y in range(clamp((ymin + 90) // size, rows),
+                           clamp((ymax + 90) // size, rows) + 1)]
+
+
+def point_feature(x, y, properties):
+    return {'type': 'Feature', 'properties': properties,
+            'geometry': {'type': 'Point', 'coordinates': [x, y]}}
+
+
+def cluster_grid_tile(model, result, z, x, y):
+    """
+    GeoJSON features for one grid tile: below CLUSTER_MAX_ZOOM the rows are
+    snapped in the database to a CLUSTER_CELLS x CLUSTER_CELLS grid and each
+    occupied cell comes back as its centroid with a `count`; above it every
+    row is a point of its own.
+    """
+    xmin, ymin, xmax, ymax = grid_tile_bounds(z, x, y)
+    params = [xmin, ymin, xmax, ymax, xmin, xmax, ymin, ymax, result]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if z >= CLUSTER_MAX_ZOOM:
+            cursor.execute(POINT_SQL.format(table=table), params)
+            return [point_feature(px, py, {'id': pk, 'count': 1})
+                    for pk, px, py in cursor.fetchall()]
+        cell = (xmax - xmin) / CLUSTER_CELLS
+        # grid points sit in the middle of the cells, so every row snaps to
+        # the centre of the cell it falls in and never across the tile edge
+        cursor.execute(CLUSTER_SQL.format(table=table), params + [
+            xmin + cell / 2, ymin + cell / 2, cell, cell])
+        return [point_feature(px, py, {'count': count})
+                for count, px, py in cursor.fetchall()]
+
+
+def cluster_features(model, result, z, bbox):
+    """
+    Cluster features of every grid tile in `bbox`, each tile cached for the
+    current CLUSTER_CACHE_TIMEOUT time slot, so counts lag new rows by at
+    most that long. Nothing is cached while the cache is unavailable.
+    """
+    tiles = grid_tiles(z, bbox)
+    if current_model_versions([model]) is None:
+        return [feature for tile in tiles
+                for feature in cluster_grid_tile(model, result, z, *tile)]
+    slot = int(time.time() // CLUSTER_CACHE_TIMEOUT)
+    keys = {(x, y): 'clusters:{}:{}:{}:{}:{}:{}'.format(
+        model._meta.label_lower, result, slot, z, x, y) for x, y in tiles}
+    cached = cache.get_many(list(keys.values()))
+    features = []
+    for tile in tiles:
+        tile_features = cached.get(keys[tile])
+        if tile_features is None:
+            tile_features = cluster_grid_tile(model, result, z, *tile)
+            cache.set(keys[tile], tile_features, CLUSTER_CACHE_TIMEOUT)
+        features.extend(tile_features)
+    return features
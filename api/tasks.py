@@ -8,7 +8,9 @@ import time
 from celery import shared_task
 from uuid import uuid4
 
-from api.management.commands.generate_excel import travel_data
+from api.ingest import flush_user_report_buffer
+from api.management.commands.generate_excel import TRAVEL_COLUMNS, \
+    user_report_export
 from api.models import CeleryTaskProgress, UserReport, MedicalFacility
 from api.utils import *
 
@@ -31,13 +33,10 @@ def generate_user_report(pk):
                'diarrahoe', 'vomit', 'runny_nose', 'address',
                'contact_no',
                'symptoms', 'has_convid_contact',
-               'has_travel_history', 'result', 'travel_history']
+               'has_travel_history', 'result']
 
-    query = UserReport.objects.all().values(*columns)
-    df = pd.DataFrame(query, columns=columns)
-    df[['country_name', 'flight_name', 'transit_names']] = df.apply(
-        travel_data, axis=1, result_type="expand")
-    del df['travel_history']
+    query = user_report_export(columns)
+    df = pd.DataFrame(query, columns=columns + TRAVEL_COLUMNS)
     df.to_excel(settings.MEDIA_ROOT + "/user_assessment_latest.xlsx")
     task.file.name = settings.MEDIA_ROOT + "/user_assessment_latest.xlsx"
     task.status = 2
@@ -72,6 +71,11 @@ def generate_facility_report(pk):
     task.save()
 
 
+@shared_task()
+def flush_user_reports():
+    return flush_user_report_buffer()
+
+
 @shared_task()
 def sync_app_data():
     from api.google_analytics import main
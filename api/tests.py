@@ -1,3 +1,496 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+import pytest
+from django.contrib.auth.models import Group, User
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mixer.backend.django import mixer
+from rest_framework.test import APIClient
+
+from api.models import MedicalFacility, MedicalFacilityCategory, \
+    MedicalFacilityType, Province, ProvinceData, District, DistrictData, \
+    Municipality, MuniData, CovidCases, GlobalData, ApplicationStat, \
+    MobileVersion, UserLocation, UserReport, SuspectReport, AgeGroupData, \
+    Device, FAQ, News, UserRole, NationalSummary, NATIONAL_SUMMARY_FIELDS
+from api.cache import current_model_versions, model_version_key
+from api.ingest import BUFFER_UNAVAILABLE_ERRORS, decode_user_report, \
+    encode_user_report, ingest_snapshots, write_user_reports
+from api.risk import score, score_batch
+from api.spatial import nearest
+from api.urls import router, urlpatterns
+from api.views import KeysetPagination
+
+API = '/api/v1/'
+
+# Every url is requested twice, with a small and a larger data set; the
+# number of SQL queries must not depend on how many rows come back.
+ROUTES = [
+    'province/',
+    'district/',
+    'municipality/',
+    'province-data/',
+    'district-data/',
+    'municipality-data/',
+    'positive-cases/',
+    'global-data/',
+    'application-data/',
+    'mobile-version/',
+    'health-type/',
+    'health-category/',
+    'health-facility/',
+    'health-facility2/',
+    'track-me/',
+    'user-report/',
+    'user-report/?data_type=morelikely',
+    'suspect-report/',
+    'age-data/',
+    'device/',
+    'faq/',
+    'news/',
+    'stats/',
+    'stats/?province=all',
+    'stats/?district=all',
+    'stats/?municipality=all',
+    'timeseries/province/',
+    'timeseries/district/',
+    'timeseries/municipality/',
+    'near-facility/?lat=27.7&long=85.3',
+    'near-report/?lat=27.7&long=85.3&result=morelikely&km=50',
+    'geojson/facility/',
+    'geojson/report/',
+    'clusters/report/?bbox=80,26,89,31&zoom=6',
+    'density/report/?zoom=8',
+    'density/location/?zoom=8',
+    'boundaries/municipality/',
+    'tiles/facilities/6/47/26.mvt',
+    'tiles/reports/6/47/26.mvt',
+    'tiles/municipalities/6/47/26.mvt',
+]
+
+# routes without a GET list to budget; api-token-auth/ has its own test
+UNBUDGETED_ROUTES = {'ingest/<str:level>/', 'api-token-auth/',
+                     'api-token-new/', 'map'}
+
+DUMMY_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+LOCMEM_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'api-tests'}}
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = LOCMEM_CACHE
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture
+def api_client(settings):
+    settings.CACHES = DUMMY_CACHE
+    user = mixer.blend(User)
+    UserRole.objects.create(
+        user=user, group=Group.objects.get_or_create(name="FrontEnd")[0])
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def seed(size):
+    location = Point(85.3, 27.7, srid=4326)
+    category = mixer.blend(MedicalFacilityCategory)
+    types = mixer.cycle(size).blend(MedicalFacilityType, category=category)
+    for index in range(size):
+        province = mixer.blend(Province)
+        district = mixer.blend(District, province=province)
+        municipality = mixer.blend(Municipality, province=province,
+                                   district=district)
+        mixer.blend(ProvinceData, province_id=province, active=True)
+        mixer.blend(DistrictData, district_id=district, active=True)
+        mixer.blend(MuniData, municipality_id=municipality, active=True)
+        mixer.blend(MedicalFacility, province=province, district=district,
+                    municipality=municipality, category=category,
+                    type=types[index], location=location)
+        mixer.blend(CovidCases, province_id=province, district_id=district,
+                    municipality_id=municipality)
+        mixer.blend(AgeGroupData, district=district,
+                    municipality=municipality)
+        mixer.blend(UserReport, location=location, temperature=103,
+                    travel_history='{"has_travel_history": true}')
+        mixer.blend(UserLocation, location=location)
+    for model in (GlobalData, ApplicationStat, MobileVersion, SuspectReport,
+                  Device, FAQ, News):
+        mixer.cycle(size).blend(model)
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(API + url)
+    assert response.status_code == 200, (url, response.status_code)
+    return len(queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ROUTES)
+def test_query_count_does_not_grow_with_results(api_client, url):
+    seed(2)
+    small = count_queries(api_client, url)
+    seed(10)
+    large = count_queries(api_client, url)
+    assert large == small, "{} ran {} queries for 2 rows and {} for 12".format(
+        url, small, large)
+
+
+def test_every_endpoint_is_budgeted():
+    paths = [url.split('?')[0] for url in ROUTES]
+    covered = {path.rstrip('/') for path in paths}
+    missing = [prefix for prefix, viewset, basename in router.registry
+               if prefix not in covered]
+    for pattern in urlpatterns:
+        route = str(pattern.pattern)
+        if hasattr(pattern, 'url_patterns') or route in UNBUDGETED_ROUTES:
+            continue
+        if not any(pattern.pattern.match(path) for path in paths):
+            missing.append(route)
+    assert not missing
+
+
+@pytest.mark.django_db
+def test_token_auth_query_count_does_not_grow_with_roles(settings):
+    settings.CACHES = DUMMY_CACHE
+    user = User.objects.create_user('reporter', password='secret')
+
+    def count():
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post(API + 'api-token-auth/', {
+                'username': 'reporter', 'password': 'secret'})
+        assert response.status_code == 200
+        return len(queries), len(response.data['roles'])
+
+    UserRole.objects.create(user=user, group=mixer.blend(Group),
+                            province=mixer.blend(Province))
+    small, roles = count()
+    for index in range(4):
+        UserRole.objects.create(user=user, group=mixer.blend(Group),
+                                province=mixer.blend(Province))
+    large, more_roles = count()
+    assert (roles, more_roles) == (1, 5)
+    assert large == small
+
+
+@pytest.mark.django_db
+def test_timeseries_buckets_each_snapshot_on_its_own_day(api_client):
+    district = mixer.blend(District, province=mixer.blend(Province))
+    first = timezone.make_aware(datetime.datetime(2020, 4, 10, 12))
+    for day, positive in ((first, 5), (first + datetime.timedelta(days=1), 8)):
+        with mock.patch('django.utils.timezone.now', return_value=day):
+            ingest_snapshots('district', [
+                {'district_id': district.id, 'total_positive': positive}])
+
+    response = api_client.get(
+        API + 'timeseries/district/?metrics=total_positive&unit={}'.format(
+            district.id))
+    assert response.status_code == 200
+    assert [(row['date'].date(), row['total_positive'])
+            for row in response.data['results']] == [
+        (datetime.date(2020, 4, 10), 5), (datetime.date(2020, 4, 11), 8)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_category_catalog_is_cached_until_a_category_changes(locmem_cache):
+    client = APIClient()
+    category = mixer.blend(MedicalFacilityCategory, name='Hospital')
+
+    def catalog(url='health-category/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(API + url)
+        assert response.status_code == 200
+        reads = [q for q in queries.captured_queries
+                 if 'api_medicalfacilitycategory' in q['sql']]
+        return response.data, len(reads)
+
+    data, reads = catalog()
+    assert [row['name'] for row in data] == ['Hospital']
+    assert reads
+    data, reads = catalog()
+    assert [row['name'] for row in data] == ['Hospital']
+    assert reads == 0
+
+    category.name = 'Health post'
+    category.save()
+    data, reads = catalog('health-category/?fields=id,name')
+    assert data == [{'id': category.id, 'name': 'Health post'}]
+    assert reads
+
+
+@pytest.mark.django_db
+def test_buffered_reports_round_trip_as_json():
+    user = mixer.blend(User)
+    item = encode_user_report({
+        'user': user, 'name': 'someone', 'temperature': 103,
+        'location': Point(85.3, 27.7, srid=4326),
+        'travel_history': '{"has_travel_history": true}'})
+    # columns a later model no longer has must not break old items
+    item = item[:-1] + ', "removed_column": 1}'
+
+    report = decode_user_report(item)
+    assert report.user_id == user.id
+    assert (report.lat, report.long) == (27.7, 85.3)
+    assert report.result == UserReport(
+        temperature=103, has_travel_history=True).get_result
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('value', [[123, 1], ['2020-13-45T00:00:00', 1],
+                                   {'a': 1}, 'not json'])
+def test_malformed_cursor_is_not_found(api_client, value):
+    encoded = value if isinstance(value, str) else json.dumps(value)
+    cursor = base64.urlsafe_b64encode(encoded.encode()).decode()
+    response = api_client.get(API + 'user-report/?cursor=' + cursor)
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_model_version_moves_only_when_the_write_commits(locmem_cache):
+    category = mixer.blend(MedicalFacilityCategory)
+    before = current_model_versions([MedicalFacilityCategory])
+    with transaction.atomic():
+        category.name = 'renamed'
+        category.save()
+        # readers still see the old row, so they must keep the old key
+        assert current_model_versions([MedicalFacilityCategory]) == before
+    assert current_model_versions([MedicalFacilityCategory]) != before
+
+
+@pytest.mark.django_db
+def test_lost_version_counters_do_not_reach_old_entries(locmem_cache):
+    before = current_model_versions([MedicalFacilityCategory])
+    locmem_cache.delete(model_version_key(MedicalFacilityCategory))
+    time.sleep(0.01)  # counters restart from the current millisecond
+    after = current_model_versions([MedicalFacilityCategory])
+    assert int(after) > int(before)
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.django_db
+def test_keyset_page_is_an_index_range_scan():
+    paginator = KeysetPagination()
+    paginator.field = 'update_date'
+    queryset = UserReport.objects.filter(
+        paginator.after(timezone.now(), 10)).order_by('-update_date', '-id')
+    sql, params = queryset[:1000].query.sql_with_params()
+    with connection.cursor() as cursor:
+        # the test table is tiny; make the planner show how it would use
+        # the index on a large one
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('SET LOCAL enable_bitmapscan = off')
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    conditions = [node.get('Index Cond', '')
+                  for node in plan_nodes(plan[0]['Plan'])]
+    assert any('update_date <=' in condition for condition in conditions), \
+        conditions
+
+
+@pytest.mark.django_db
+def test_buffered_report_is_saved_directly_while_redis_is_down(api_client):
+    with mock.patch('api.views.buffer_user_report',
+                    side_effect=BUFFER_UNAVAILABLE_ERRORS[0]):
+        response = api_client.post(API + 'user-report/?buffered=1', {
+            'name': 'someone', 'temperature': 99, 'lat': 27.7, 'long': 85.3,
+            'travel_history': '{}'}, format='json')
+    assert response.status_code == 201
+    assert UserReport.objects.filter(name='someone').count() == 1
+
+
+@pytest.mark.django_db
+def test_buffered_reports_keep_their_submission_time():
+    submitted = timezone.make_aware(datetime.datetime(2020, 4, 10, 12))
+    with mock.patch('django.utils.timezone.now', return_value=submitted):
+        item = encode_user_report({'name': 'someone', 'travel_history': '{}'})
+    [pk] = write_user_reports([item])
+    assert UserReport.objects.get(pk=pk).update_date == submitted
+
+
+def baseline_result(temperature, has_travel_history, has_convid_contact):
+    # UserReport.get_result before the rules moved to api/risk.py
+    if has_travel_history or has_convid_contact:
+        if temperature >= 102:
+            return "morelikely"
+        elif temperature >= 99:
+            return "likely"
+    return "lesslikely"
+
+
+RISK_CASES = [
+    (temperature, travel, contact)
+    for temperature in (0, 97.5, 98.9, 99, 101.9, 102, 104)
+    for travel, contact in ((False, False), (True, False), (False, True),
+                            (True, True), (False, None))
+]
+
+
+@pytest.mark.parametrize('temperature,travel,contact', RISK_CASES)
+def test_score_matches_the_baseline_rules(temperature, travel, contact):
+    expected = baseline_result(temperature, travel, contact)
+    assert score(temperature, travel, contact) == expected
+    report = UserReport(temperature=temperature, has_travel_history=travel,
+                        has_convid_contact=contact)
+    assert report.get_result == expected
+
+
+def test_score_batch_agrees_with_score():
+    temperatures, travels, contacts = zip(*RISK_CASES)
+    assert list(score_batch(temperatures, travels, contacts)) == [
+        score(*case) for case in RISK_CASES]
+
+
+@pytest.mark.django_db
+def test_rollup_records_a_new_timeseries_point_per_day(api_client, settings):
+    settings.SNAPSHOT_ROLLUP = True
+    district = mixer.blend(District, province=mixer.blend(Province))
+    municipality = mixer.blend(Municipality, district=district,
+                               province=district.province)
+    first = timezone.make_aware(datetime.datetime(2020, 4, 10, 12))
+    for day, positive in ((first, 5), (first + datetime.timedelta(days=1), 8)):
+        with mock.patch('django.utils.timezone.now', return_value=day):
+            ingest_snapshots('municipality', [
+                {'municipality_id': municipality.id,
+                 'total_positive': positive}])
+
+    response = api_client.get(
+        API + 'timeseries/district/?metrics=total_positive&unit={}'.format(
+            district.id))
+    assert response.status_code == 200
+    assert [(row['date'].date(), row['total_positive'])
+            for row in response.data['results']] == [
+        (datetime.date(2020, 4, 10), 5), (datetime.date(2020, 4, 11), 8)]
+    assert DistrictData.objects.filter(
+        district_id=district, active=True).count() == 1
+
+
+@pytest.fixture
+def facility_units(settings):
+    settings.CACHES = DUMMY_CACHE
+    units = {}
+    for name in ('home', 'other'):
+        province = mixer.blend(Province)
+        district = mixer.blend(District, province=province)
+        units[name] = {'province': province, 'district': district,
+                       'municipality': mixer.blend(
+                           Municipality, province=province,
+                           district=district)}
+    units['categories'] = mixer.cycle(2).blend(MedicalFacilityCategory)
+    units['facility'] = mixer.blend(
+        MedicalFacility, category=units['categories'][0],
+        used_for_corona_response=False, location=Point(85.3, 27.7, srid=4326),
+        **units['home'])
+    MedicalFacility.rebuild_unit_counters()
+    NationalSummary.rebuild()
+    return units
+
+
+def add_facility(units):
+    mixer.blend(MedicalFacility, category=units['categories'][1],
+                used_for_corona_response=True,
+                location=Point(85.3, 27.7, srid=4326), **units['home'])
+
+
+def delete_facility(units):
+    units['facility'].delete()
+
+
+def change_category(units):
+    units['facility'].category = units['categories'][1]
+    units['facility'].save()
+
+
+def toggle_corona_response(units):
+    units['facility'].used_for_corona_response = True
+    units['facility'].save()
+
+
+def move_facility(units):
+    for field, unit in units['other'].items():
+        setattr(units['facility'], field, unit)
+    units['facility'].save()
+
+
+FACILITY_CHANGES = [add_facility, delete_facility, change_category,
+                    toggle_corona_response, move_facility]
+
+
+def facility_counters():
+    return {(model.__name__, row['id']): row
+            for model in (Province, District, Municipality)
+            for row in model.objects.values(
+                'id', 'facility_count', 'corona_facility_count',
+                'facility_category_count')}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('change', FACILITY_CHANGES)
+def test_facility_counters_match_a_rebuild(facility_units, change):
+    change(facility_units)
+    incremental = facility_counters()
+    MedicalFacility.rebuild_unit_counters()
+    assert incremental == facility_counters()
+
+
+def replace_province_snapshot(units):
+    mixer.blend(ProvinceData, province_id=units['home']['province'],
+                active=True, total_positive=7, num_of_bed=20)
+
+
+def delete_province_snapshot(units):
+    ProvinceData.objects.filter(
+        province_id=units['home']['province']).delete()
+
+
+def national_totals():
+    summary = NationalSummary.objects.get(pk=NationalSummary.SINGLETON_PK)
+    return {f: getattr(summary, f)
+            for f in NATIONAL_SUMMARY_FIELDS + ('facility_count',)}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('change', FACILITY_CHANGES + [
+    replace_province_snapshot, delete_province_snapshot])
+def test_national_summary_matches_a_rebuild(facility_units, change):
+    mixer.blend(ProvinceData, province_id=facility_units['home']['province'],
+                active=True, total_positive=3, num_of_bed=10)
+    change(facility_units)
+    incremental = national_totals()
+    NationalSummary.rebuild()
+    assert incremental == national_totals()
+
+
+@pytest.mark.django_db
+def test_nearest_sorts_by_ground_distance_not_degrees(settings):
+    settings.CACHES = DUMMY_CACHE
+    # at 28°N a degree of longitude is ~12% shorter than one of latitude:
+    # the facility 0.105° east is closer than the three 0.10x° north
+    for offset in (0.100, 0.101, 0.102):
+        mixer.blend(MedicalFacility, name='north',
+                    location=Point(85, 28 + offset, srid=4326))
+    mixer.blend(MedicalFacility, name='east',
+                location=Point(85.105, 28, srid=4326))
+
+    [closest] = nearest(MedicalFacility.objects.all(),
+                        Point(85, 28, srid=4326), 1)
+    assert closest.name == 'east'
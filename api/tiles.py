@@ -0,0 +1,160 @@
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.db import connection
+
+from api.cache import current_model_versions
+from api.models import MedicalFacility, Municipality, UserReport
+
+# half the width of the web mercator square, in metres
+MERCATOR_EXTENT = 20037508.342789244
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+
+TILE_LAYERS = {
+    'facilities': {
+        'model': MedicalFacility,
+        'geometry': 'location',
+        'fields': ('id', 'name', 'category_id', 'type_id', 'ownership',
+                   'used_for_corona_response', 'num_of_bed',
+                   'num_of_icu_bed', 'num_of_isolation_bed',
+                   'num_of_ventilators'),
+        'where': '',
+        'public': True,
+    },
+    'reports': {
+        'model': UserReport,
+        'geometry': 'location',
+        'fields': ('id', 'result'),
+        'where': "result = 'morelikely'",
+        'public': False,
+        # reports change with every submission, which would throw the
+        # layer's whole tile tree away each time; render them on demand
+        'file_cache': False,
+    },
+    'municipalities': {
+        # the facility counters are bumped on Municipality when they change
+        'model': Municipality,
+        'geometry': 'geom',
+        'fields': ('id', 'name', 'province_id', 'district_id',
+                   'facility_count', 'corona_facility_count'),
+        'where': '',
+        'simplify': True,
+        'public': True,
+    },
+}
+
+
+def tile_bounds(z, x, y):
+    """
+    Web mercator (EPSG:3857) bounds of tile z/x/y, as
+    (xmin, ymin, xmax, ymax). PostGIS 2.5 has no ST_TileEnvelope.
+    """
+    size = 2 * MERCATOR_EXTENT / (2 ** z)
+    xmin = -MERCATOR_EXTENT + x * size
+    ymax = MERCATOR_EXTENT - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_version(layer):
+    """
+    The current version of the layer's model, or None when the version
+    counters can't be read.
+    """
+    return current_model_versions([TILE_LAYERS[layer]['model']])
+
+
+def tile_sql(layer):
+    """
+    One query rendering a whole layer tile: rows are found through the GiST
+    index on the geometry (`&&` against the tile envelope), clipped and
+    quantized to the tile grid by ST_AsMVTGeom and encoded by ST_AsMVT.
+    Polygons are first simplified to a pixel of the requested zoom.
+    """
+    config = TILE_LAYERS[layer]
+    model = config['model']
+    table = model._meta.db_table
+    geometry = 't."{}"'.format(
+        model._meta.get_field(config['geometry']).column)
+    columns = ', '.join('t."{}"'.format(name) for name in config['fields'])
+    projected = 'ST_Transform({}, 3857)'.format(geometry)
+    if config.get('simplify'):
+        projected = 'ST_SimplifyPreserveTopology({}, %(pixel)s)'.format(
+            projected)
+    where = ' AND ' + config['where'] if config['where'] else ''
+    return (
+        'WITH bounds AS (SELECT ST_MakeEnvelope(%(xmin)s, %(ymin)s, '
+        '%(xmax)s, %(ymax)s, 3857) AS geom), '
+        'features AS ('
+        'SELECT {columns}, ST_AsMVTGeom({projected}, bounds.geom, '
+        '{extent}, {buffer}, true) AS mvt_geom '
+        'FROM "{table}" t, bounds '
+        'WHERE {geometry} && ST_Transform(bounds.geom, 4326){where}) '
+        "SELECT ST_AsMVT(features.*, '{layer}', {extent}, 'mvt_geom') "
+        'FROM features WHERE mvt_geom IS NOT NULL'
+    ).format(columns=columns, projected=projected, extent=TILE_EXTENT,
+             buffer=TILE_BUFFER, table=table, geometry=geometry,
+             where=where, layer=layer)
+
+
+def render_tile(layer, z, x, y):
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+    params = {'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax,
+              'pixel': (xmax - xmin) / TILE_EXTENT}
+    with connection.cursor() as cursor:
+        cursor.execute(tile_sql(layer), params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] else b''
+
+
+def tile_path(layer, version, z, x, y):
+    return os.path.join(settings.TILE_CACHE_ROOT, layer, version, str(z),
+                        str(x), '{}.mvt'.format(y))
+
+
+def prune_tile_cache(layer, version):
+    """
+    Removes tiles rendered for older versions of the layer.
+    """
+    root = os.path.join(settings.TILE_CACHE_ROOT, layer)
+    for name in os.listdir(root):
+        if name != version:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def get_tile(layer, z, x, y):
+    """
+    Returns (tile bytes, version). Tiles are cached on disk under the current
+    version of the layer's model, which is bumped on every save or delete,
+    so a changed row makes all of the layer's cached tiles unreachable.
+    Layers with `file_cache` off, or an unknown version, are rendered on
+    every request.
+    """
+    version = tile_version(layer)
+    if version is None or not TILE_LAYERS[layer].get('file_cache', True):
+        return render_tile(layer, z, x, y), version
+    path = tile_path(layer, version, z, x, y)
+    try:
+        with open(path, 'rb') as f:
+            return f.read(), version
+    except IOError:
+        pass
+    tile = render_tile(layer, z, x, y)
+    version_root = os.path.join(settings.TILE_CACHE_ROOT, layer, version)
+    if not os.path.isdir(version_root):
+        os.makedirs(version_root, exist_ok=True)
+        prune_tile_cache(layer, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write aside and rename so concurrent readers never see partial tiles
+    partial = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(partial, 'wb') as f:
+        f.write(tile)
+    os.replace(partial, path)
+    return tile, version
@@ -0,0 +1,64 @@
+import gzip
+import json
+
+# quantization grid size (points per axis) for each level of detail
+QUANTIZATION = {'low': 10 ** 4, 'medium': 10 ** 5, 'high': 10 ** 6}
+
+
+def quantized_topology(name, features, quantization):
+    """
+    Encodes `features`, a list of (id, properties, MultiPolygon), as a
+    quantized TopoJSON Topology with one GeometryCollection called `name`.
+    Coordinates are snapped to a `quantization` x `quantization` grid over
+    the bounding box and delta-encoded, so arcs are short integer lists.
+    Every ring is its own arc; shared borders are not merged.
+    """
+    extents = [geometry.extent for _, _, geometry in features if geometry]
+    if not extents:
+        return {'type': 'Topology', 'objects': {name: {
+            'type': 'GeometryCollection', 'geometries': []}}, 'arcs': []}
+    x0 = min(e[0] for e in extents)
+    y0 = min(e[1] for e in extents)
+    x1 = max(e[2] for e in extents)
+    y1 = max(e[3] for e in extents)
+    kx = (x1 - x0) / (quantization - 1) or 1
+    ky = (y1 - y0) / (quantization - 1) or 1
+
+    arcs = []
+
+    def encode_ring(ring):
+        arc = []
+        previous_x = previous_y = 0
+        for x, y in ring:
+            qx = int(round((x - x0) / kx))
+            qy = int(round((y - y0) / ky))
+            if arc and qx == previous_x and qy == previous_y:
+                continue
+            arc.append([qx - previous_x, qy - previous_y])
+            previous_x, previous_y = qx, qy
+        arcs.append(arc)
+        return [len(arcs) - 1]
+
+    geometries = []
+    for pk, properties, geometry in features:
+        if not geometry:
+            geometries.append({'type': None, 'id': pk,
+                               'properties': properties})
+            continue
+        geometries.append({
+            'type': 'MultiPolygon', 'id': pk, 'properties': properties,
+            'arcs': [[encode_ring(ring.coords) for ring in polygon]
+                     for polygon in geometry]})
+    return {
+        'type': 'Topology',
+        'bbox': [x0, y0, x1, y1],
+        'transform': {'scale': [kx, ky], 'translate': [x0, y0]},
+        'objects': {name: {'type': 'GeometryCollection',
+                           'geometries': geometries}},
+        'arcs': arcs,
+    }
+
+
+def gzip_json(data):
+    return gzip.compress(json.dumps(data, separators=(',', ':'))
+                         .encode('utf-8'), compresslevel=9)
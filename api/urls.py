@@ -33,11 +33,23 @@ urlpatterns = [
     path('', include(router.urls)),
     path('stats/', views.StatsAPI.as_view(
         {'get': 'list'})),
+    path('timeseries/<str:level>/', views.TimeSeriesAPI.as_view(),
+         name="timeseries"),
+    path('ingest/<str:level>/', views.SnapshotIngestAPI.as_view(),
+         name="snapshot-ingest"),
     path('near-facility/', NearFacilityViewSet.as_view(), name="fac-api"),
     path('near-report/', NearUserReportViewSet.as_view(), name="user-api"),
     path('geojson/facility/', SpaceGeojsonViewSet.as_view(), name="space"),
     path('geojson/report/', NearUserGeojsonViewSet.as_view(),
          name="user-geojson"),
+    path('clusters/report/', views.UserReportClusterViewSet.as_view(),
+         name="user-clusters"),
+    path('density/<str:source>/', views.DensityViewSet.as_view(),
+         name="density"),
+    path('boundaries/municipality/', views.BoundaryViewSet.as_view(),
+         name="municipality-boundaries"),
+    path('tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt',
+         views.VectorTileView.as_view(), name="vector-tile"),
     path('map', MapView.as_view(), name="map"),
 ]
 
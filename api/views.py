@@ -1,13 +1,36 @@
+import base64
+import datetime
+import functools
+import gzip
 import os
+from collections import OrderedDict
+from itertools import islice
 
 import random
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Sum, Count, Max
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db.models import Sum, Count, Max, IntegerField, Q
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.decorators import api_view
 from uuid import uuid4
 
+from api.cache import CachedResponseMixin, VersionedArtifact, \
+    conditional_response, current_model_versions
+from api.filters import GeometryFilterBackend
+from api.geojson import stream_feature_collection
+from api.ingest import ingest_snapshots, read_snapshot_file, \
+    SnapshotIngestError, buffer_user_report, request_user_report_flush, \
+    BUFFER_UNAVAILABLE_ERRORS
 from api.permission import IsFrontendUser
+from api.risk import risk_message
+from api.spatial import CELL_ZOOMS, CLUSTER_MAX_TILES, cluster_features, \
+    grid_tiles, nearest, quadkey_bounds
+from api.tiles import TILE_LAYERS, get_tile, tile_version, valid_tile
+from api.topojson import QUANTIZATION, gzip_json, quantized_topology
 from .serializers import MedicalFacilitySerializer, \
     MedicalFacilityCategorySerializer, MedicalFacilityTypeSerializer, \
     CaseSerializer, ProvinceSerializer, ProvinceDataSerializer, \
@@ -16,17 +39,21 @@ from .serializers import MedicalFacilitySerializer, \
     SpaceSerializer, DistrictDataSerializer, MuncDataSerializer, \
     GlobalDataSerializer, MobileVersionSerializer, UserSerializer, \
     DeviceSerializer, SuspectSerializer, SmallUserReportSerializer, \
-    NearUserSerializer, ApplicationDataSerializer, FAQSerializer, NewsSerializer
+    NearUserSerializer, ApplicationDataSerializer, FAQSerializer, \
+    NewsSerializer, NationalSummarySerializer, MedicalFacilityValuesSerializer, \
+    MunicipalityListSerializer, has_sparse_fieldset, sparse_field_names
 from .models import MedicalFacility, MedicalFacilityType, \
     MedicalFacilityCategory, CovidCases, Province, ProvinceData, Municipality, \
     District, UserLocation, UserReport, AgeGroupData, DistrictData, MuniData, \
     GlobalData, MobileVersion, Device, SuspectReport, CeleryTaskProgress, \
-    ApplicationStat, FAQ, News
-from .tasks import generate_user_report, generate_facility_report
+    ApplicationStat, FAQ, News, NationalSummary
+from .tasks import generate_user_report, generate_facility_report, \
+    flush_user_reports
 
 from django_filters.rest_framework import DjangoFilterBackend
 
-from rest_framework import viewsets, pagination, views, status
+from rest_framework import viewsets, pagination, views, status, encoders
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -35,11 +62,11 @@ from rest_framework.authtoken.models import Token
 import io
 import json
 from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.geos import GEOSGeometry, Point
+from django.contrib.gis.geos import GEOSGeometry, Point, Polygon
 from django.contrib.gis.measure import D
-from django.core.serializers import serialize
 from rest_framework.parsers import JSONParser
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(pagination.PageNumberPagination):
@@ -54,9 +81,184 @@ class BigResultsSetPagination(pagination.PageNumberPagination):
     max_page_size = 1000
 
 
+def estimate_count(queryset):
+    """
+    Row estimate from the planner statistics instead of a COUNT(*).
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Cursor pagination on (`keyset_field`, id), newest first. Every page is an
+    index range scan, so page 5000 costs the same as page 1. `count` is a
+    planner estimate unless `?count=exact` is passed.
+    """
+    page_size = 1000
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.field = getattr(view, 'keyset_field', None)
+        self.page_size = self.get_page_size(request)
+        ordering = ['-id'] if self.field is None else ['-' + self.field, '-id']
+        queryset = queryset.order_by(*ordering)
+
+        self.exact = request.query_params.get('count') == 'exact'
+        self.count = queryset.count() if self.exact else \
+            estimate_count(queryset)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(*position))
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def after(self, value, pk):
+        if self.field is None:
+            return Q(id__lt=pk)
+        if value is None:
+            # DESC puts NULLs first, so every dated row is still to come.
+            return Q(**{self.field + '__isnull': True, 'id__lt': pk}) | \
+                Q(**{self.field + '__isnull': False})
+        # the OR alone can't bound the index scan; the redundant `<=`
+        # gives Postgres a range condition on (field, id)
+        return Q(**{self.field + '__lte': value}) & (
+            Q(**{self.field + '__lt': value}) |
+            Q(**{self.field: value, 'id__lt': pk}))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(
+                base64.urlsafe_b64decode(encoded.encode()).decode())
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if value is not None and self.field is not None:
+            try:
+                # parse_datetime raises TypeError on non-strings and
+                # ValueError on well-formed but impossible dates
+                value = parse_datetime(value) \
+                    if isinstance(value, str) else None
+            except ValueError:
+                value = None
+            if value is None:
+                raise NotFound('Invalid cursor')
+        return value, pk
+
+    def encode_cursor(self, row):
+        value = None
+        if self.field is not None:
+            value = getattr(row, self.field)
+            value = value.isoformat() if value is not None else None
+        cursor = json.dumps([value, row.pk])
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('count_is_estimate', not self.exact),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class KeysetPaginationMixin(object):
+    """
+    Switches a list to KeysetPagination with `?pagination=cursor` (or when a
+    cursor is passed) and keeps the view's regular pagination otherwise.
+    """
+    keyset_field = 'update_date'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or \
+                    params.get(KeysetPagination.cursor_query_param):
+                self._paginator = KeysetPagination()
+            else:
+                return super(KeysetPaginationMixin, self).paginator
+        return self._paginator
+
+
 NationalHotine = settings.HOTLINE
 
 
+def snapshot_validators(view, request, *args, **kwargs):
+    params = request.query_params
+    if params.get('province'):
+        queryset = ProvinceData.objects.filter(active=True)
+    elif params.get('district'):
+        queryset = DistrictData.objects.filter(active=True)
+    elif params.get('municipality'):
+        queryset = MuniData.objects.filter(active=True)
+    else:
+        queryset = ProvinceData.objects.filter(active=True)
+    marker = queryset.aggregate(last=Max('update_date'), rows=Count('id'))
+    summary = NationalSummary.get_solo()
+    last_modified = max([d for d in (marker['last'], summary.facility_updated)
+                         if d is not None], default=None)
+    etag = "{}-{}-{}-{}".format(
+        queryset.model.__name__, marker['rows'],
+        marker['last'].timestamp() if marker['last'] else 0,
+        summary.facility_version)
+    return etag, last_modified
+
+
+# everything a serialized facility is read from
+FACILITY_CACHE_MODELS = (MedicalFacility, MedicalFacilityType,
+                         MedicalFacilityCategory, Province, District,
+                         Municipality)
+
+
+def facility_validators(view, request, *args, **kwargs):
+    # built from the same versions as the response cache key, so a new
+    # validator always comes with a new body; versions carry no timestamp,
+    # hence no Last-Modified
+    version = current_model_versions(FACILITY_CACHE_MODELS)
+    if version is None:
+        return None, None
+    return "facility-{}".format(version), None
+
+
+def tile_validators(view, request, layer, z, x, y):
+    if layer not in TILE_LAYERS or not valid_tile(z, x, y):
+        return None, None
+    version = tile_version(layer)
+    if version is None:
+        return None, None
+    return "tile-{}-{}".format(layer, version), None
+
+
 # Create your views here.
 class StatsAPI(viewsets.ModelViewSet):
     queryset = ProvinceData.objects.filter(active=True)
@@ -74,77 +276,252 @@ class StatsAPI(viewsets.ModelViewSet):
             permission_classes = [AllowAny]
         return [permission() for permission in permission_classes]
 
+    def serialize(self, serializer_class, queryset):
+        context = self.get_serializer_context()
+        if has_sparse_fieldset(self.request):
+            queryset = sparse_queryset(
+                queryset, serializer_class(context=context))
+        return Response(
+            serializer_class(queryset, many=True, context=context).data)
+
+    @conditional_response(snapshot_validators)
     def list(self, request):
-        queryset = ProvinceData.objects.filter(active=True).annotate(
-                facility_count=Count("province_id__medical_facility"))
+        queryset = ProvinceData.objects.filter(active=True).select_related(
+            'province_id')
         province = self.request.query_params.get('province')
         district = self.request.query_params.get('district')
         municipality = self.request.query_params.get('municipality')
         if province == "all":
-            data = ProvinceDataSerializer(queryset, many=True).data
-            return Response(data)
+            return self.serialize(ProvinceDataSerializer, queryset)
 
         elif province:
-            queryset = queryset.filter(province_id=province).annotate(
-                facility_count=Count("province_id__medical_facility"))
-            data = ProvinceDataSerializer(queryset, many=True).data
-            return Response(data)
+            queryset = queryset.filter(province_id=province)
+            return self.serialize(ProvinceDataSerializer, queryset)
 
         elif district == "all":
-            queryset = DistrictData.objects.filter(active=True).annotate(
-                facility_count=Count("district_id__medical_facility"))
-            data = DistrictDataSerializer(queryset, many=True).data
-            return Response(data)
+            queryset = DistrictData.objects.filter(
+                active=True).select_related('district_id')
+            return self.serialize(DistrictDataSerializer, queryset)
 
         elif district:
             queryset = DistrictData.objects.filter(
-                active=True, district_id=district).annotate(
-                facility_count=Count("district_id__medical_facility"))
-            data = DistrictDataSerializer(queryset, many=True).data
-            return Response(data)
+                active=True, district_id=district).select_related(
+                'district_id')
+            return self.serialize(DistrictDataSerializer, queryset)
         elif municipality == "all":
-            queryset = MuniData.objects.filter(active=True).annotate(
-                facility_count=Count("municipality_id__medical_facility"))
-            data = MuncDataSerializer(queryset, many=True).data
-            return Response(data)
+            queryset = MuniData.objects.filter(active=True).select_related(
+                'municipality_id')
+            return self.serialize(MuncDataSerializer, queryset)
 
         elif municipality:
             queryset = MuniData.objects.filter(
-                active=True, municipality_id=municipality).annotate(
-                facility_count=Count("municipality_id__medical_facility"))
-            data = MuncDataSerializer(queryset, many=True).data
-            return Response(data)
-        facility_count = MedicalFacility.objects.all().count()
-        # tested = MedicalFacility.objects.aggregate(
-        #     tested=Sum('total_tested'))
-        data = queryset.aggregate(
-            tested=Sum('total_tested'),
-            total_samples_collected=Sum('total_samples_collected'),
-            total_samples_pending=Sum('total_samples_pending'),
-            total_negative=Sum('total_negative'),
-            update_date=Max('update_date'),
-            confirmed=Sum('total_positive'),
-            isolation=Sum('total_in_isolation'),
-            total_recovered=Sum('total_recovered'),
-            death=Sum('total_death'),
-            icu=Sum('num_of_icu_bed'),
-            occupied_icu=Sum('occupied_icu_bed'),
-            ventilator=Sum('num_of_ventilators'),
-            occupied_ventilator=Sum('occupied_ventilators'),
-            isolation_bed=Sum('num_of_isolation_bed'),
-            occupied_isolation_bed=Sum('occupied_ventilators'),
-        )
-        # data.update(tested)
-        data.update({'facility_count': facility_count})
+                active=True, municipality_id=municipality).select_related(
+                'municipality_id')
+            return self.serialize(MuncDataSerializer, queryset)
+        summary = NationalSummary.get_solo()
+        data = NationalSummarySerializer(
+            summary, context=self.get_serializer_context()).data
         data.update({"hotline": NationalHotine})
         return Response(data)
 
 
-class MedicalApi(viewsets.ModelViewSet):
+TIME_SERIES_LEVELS = {
+    'province': (ProvinceData, 'province_id'),
+    'district': (DistrictData, 'district_id'),
+    'municipality': (MuniData, 'municipality_id'),
+}
+TIME_SERIES_BUCKETS = {'day': TruncDay, 'week': TruncWeek}
+TIME_SERIES_DEFAULT_METRICS = ['total_tested', 'total_positive',
+                               'total_recovered', 'total_death']
+
+
+class TimeSeriesAPI(views.APIView):
+    """
+    Snapshot history per administrative unit, bucketed by day or week.
+    Each bucket carries the last snapshot recorded for the unit inside it,
+    by `recorded_date`, which deactivating a snapshot leaves untouched.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, level):
+        if level not in TIME_SERIES_LEVELS:
+            return Response({'message': 'Unknown level'},
+                            status=status.HTTP_404_NOT_FOUND)
+        model, unit_field = TIME_SERIES_LEVELS[level]
+        params = request.query_params
+        interval = params.get('interval', 'day')
+        if interval not in TIME_SERIES_BUCKETS:
+            return Response({'message': 'interval must be day or week'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        allowed = [f.name for f in model._meta.fields
+                   if isinstance(f, IntegerField)]
+        metrics = params.get('metrics')
+        metrics = metrics.split(',') if metrics else \
+            TIME_SERIES_DEFAULT_METRICS
+        invalid = [m for m in metrics if m not in allowed]
+        if invalid:
+            return Response({'message': 'Unknown metrics: {}'.format(
+                ', '.join(invalid))}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = model._base_manager.all()
+        if params.get('unit'):
+            if not params['unit'].isdigit():
+                return Response({'message': 'unit must be an id'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(**{unit_field: params['unit']})
+        for param, lookup in (('start', 'gte'), ('end', 'lt')):
+            if not params.get(param):
+                continue
+            day = parse_date(params[param])
+            if day is None:
+                return Response({'message': '{} must be YYYY-MM-DD'.format(
+                    param)}, status=status.HTTP_400_BAD_REQUEST)
+            if lookup == 'lt':
+                day += datetime.timedelta(days=1)
+            moment = timezone.make_aware(
+                datetime.datetime.combine(day, datetime.time.min))
+            queryset = queryset.filter(
+                **{'recorded_date__{}'.format(lookup): moment})
+
+        rows = queryset.annotate(
+            bucket=TIME_SERIES_BUCKETS[interval]('recorded_date')).order_by(
+            unit_field, 'bucket', '-recorded_date', '-id').distinct(
+            unit_field, 'bucket').values(unit_field, 'bucket', *metrics)
+        results = [dict(unit=row.pop(unit_field), date=row.pop('bucket'),
+                        **row) for row in rows]
+        return Response({'level': level, 'interval': interval,
+                         'metrics': metrics, 'results': results})
+
+
+def sparse_queryset(queryset, serializer, extra=()):
+    """
+    Restricts `queryset` with only() to the columns `serializer`'s fields
+    read, plus the primary key, `extra` and any select_related relation.
+    Left untouched when a field reads something other than a model field
+    (method fields, properties, annotations), as its columns are unknown.
+    """
+    model = queryset.model
+    concrete = {field.name for field in model._meta.concrete_fields}
+    names = {model._meta.pk.name}
+    names.update(extra)
+    for field in serializer.fields.values():
+        source = field.source.split('.')[0]
+        if source not in concrete:
+            return queryset
+        names.add(source)
+    related = queryset.query.select_related
+    if related is True:
+        return queryset
+    if related:
+        names.update(related)
+    return queryset.only(*names)
+
+
+class SparseFieldsetViewMixin(object):
+    """
+    With `?fields=` / `?omit=` the serializer is narrowed (see
+    SparseFieldsetMixin) and the queryset is narrowed with it, so unused
+    columns are not read from the database at all.
+    """
+
+    def sparse_names(self):
+        if not has_sparse_fieldset(self.request):
+            return None
+        return list(self.get_serializer().fields)
+
+    def filter_queryset(self, queryset):
+        queryset = super(SparseFieldsetViewMixin, self).filter_queryset(
+            queryset)
+        if not has_sparse_fieldset(self.request):
+            return queryset
+        extra = [getattr(self, 'keyset_field', None)]
+        return sparse_queryset(queryset, self.get_serializer(),
+                               [name for name in extra if name])
+
+
+class StreamingListMixin(object):
+    """
+    `?stream=1` streams the list as a json array instead of building it in
+    memory. Rows come from a server-side cursor in `stream_chunk_size`
+    batches and each batch is encoded and sent on its own.
+    """
+    stream_chunk_size = 2000
+
+    def is_streaming(self, request):
+        return request.query_params.get('stream') == '1'
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_streaming(request):
+            return super(StreamingListMixin, self).list(
+                request, *args, **kwargs)
+        rows = self.get_stream_queryset().iterator(
+            chunk_size=self.stream_chunk_size)
+        return StreamingHttpResponse(self.stream_json(rows),
+                                     content_type='application/json')
+
+    def get_stream_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def serialize_stream_chunk(self, rows):
+        return self.get_serializer(rows, many=True).data
+
+    def stream_json(self, rows):
+        yield b'['
+        separator = b''
+        for chunk in iter(lambda: list(islice(rows, self.stream_chunk_size)),
+                          []):
+            encoded = json.dumps(self.serialize_stream_chunk(chunk),
+                                 cls=encoders.JSONEncoder, ensure_ascii=False,
+                                 separators=(',', ':'))
+            yield separator + encoded[1:-1].encode('utf-8')
+            separator = b','
+        yield b']'
+
+
+class FacilityValuesListMixin(SparseFieldsetViewMixin, StreamingListMixin):
+    """
+    Lists facilities through MedicalFacilityValuesSerializer, streamed or
+    not. `?fast=0` falls back to the regular serializer.
+    """
+    values_serializer = MedicalFacilityValuesSerializer()
+
+    def use_values(self):
+        return self.request.query_params.get('fast') != '0'
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values() or self.is_streaming(request):
+            return super(FacilityValuesListMixin, self).list(
+                request, *args, **kwargs)
+        queryset = self.get_stream_queryset()
+        names = self.sparse_names()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.values_serializer.to_representation(page, names))
+        return Response(self.values_serializer.to_representation(queryset,
+                                                                 names))
+
+    def get_stream_queryset(self):
+        queryset = super(FacilityValuesListMixin, self).get_stream_queryset()
+        if self.use_values():
+            return self.values_serializer.values(queryset, self.sparse_names())
+        return queryset
+
+    def serialize_stream_chunk(self, rows):
+        if self.use_values():
+            return self.values_serializer.to_representation(
+                rows, self.sparse_names())
+        return super(FacilityValuesListMixin, self).serialize_stream_chunk(
+            rows)
+
+
+class MedicalApi(CachedResponseMixin, FacilityValuesListMixin,
+                 viewsets.ModelViewSet):
     queryset = MedicalFacility.objects.all()
     serializer_class = MedicalFacilitySerializer
+    cache_models = FACILITY_CACHE_MODELS
 
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, GeometryFilterBackend]
     filterset_fields = ['id', 'type', 'municipality', 'district', 'province',
                         'category']
 
@@ -162,13 +539,21 @@ class MedicalApi(viewsets.ModelViewSet):
         return self.queryset.select_related('type', 'municipality',
                                             'district', 'province', 'category')
 
+    @conditional_response(facility_validators)
+    def list(self, request, *args, **kwargs):
+        return super(MedicalApi, self).list(request, *args, **kwargs)
+
+    @conditional_response(facility_validators)
+    def retrieve(self, request, *args, **kwargs):
+        return super(MedicalApi, self).retrieve(request, *args, **kwargs)
 
-class MedicalApi2(viewsets.ModelViewSet):
+
+class MedicalApi2(FacilityValuesListMixin, viewsets.ModelViewSet):
     queryset = MedicalFacility.objects.all()
     serializer_class = MedicalFacilitySerializer
     pagination_class = StandardResultsSetPagination
 
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, GeometryFilterBackend]
     filterset_fields = ['id', 'type', 'municipality', 'province', 'district']
 
     def get_permissions(self):
@@ -206,10 +591,91 @@ class MedicalApi2(viewsets.ModelViewSet):
                 return Response({'message': 'File being updated'})
         return super(MedicalApi2, self).list(request, *args, **kwargs)
 
+    def get_queryset(self):
+        return self.queryset.select_related('type', 'municipality',
+                                            'district', 'province', 'category')
+
     
-class MedicalCategoryApi(viewsets.ModelViewSet):
-    queryset = MedicalFacilityCategory.objects.order_by('id')
+def build_category_catalog():
+    queryset = MedicalFacilityCategory.objects.prefetch_related(
+        'Category').order_by('id')
+    return list(MedicalFacilityCategorySerializer(queryset, many=True).data)
+
+
+category_catalog = VersionedArtifact(
+    'health-category', (MedicalFacilityCategory, MedicalFacilityType),
+    build_category_catalog)
+
+
+def build_boundary_topology(detail):
+    rows = Municipality.objects.order_by('id').values_list(
+        'id', 'name', 'mun_id', 'district_id', 'province_id',
+        'geom_' + detail)
+    features = [(pk, {'name': name, 'mun_id': mun_id,
+                      'district': district, 'province': province}, geom)
+                for pk, name, mun_id, district, province, geom in rows]
+    return gzip_json(quantized_topology('municipality', features,
+                                        QUANTIZATION[detail]))
+
+
+boundary_topologies = {
+    detail: VersionedArtifact(
+        'boundaries-municipality-' + detail, (Municipality,),
+        functools.partial(build_boundary_topology, detail))
+    for detail in Municipality.BOUNDARY_TOLERANCES}
+
+
+def boundary_validators(view, request, *args, **kwargs):
+    detail = request.query_params.get('detail', 'low')
+    if detail not in boundary_topologies:
+        return None, None
+    version = current_model_versions((Municipality,))
+    if version is None:
+        return None, None
+    return "boundaries-{}-{}".format(detail, version), None
+
+
+class BoundaryViewSet(views.APIView):
+    """
+    Municipality boundaries as quantized TopoJSON, simplified to `detail`
+    (low, medium or high) and kept gzipped in the cache.
+    """
+    permission_classes = [AllowAny]
+
+    @conditional_response(boundary_validators)
+    def get(self, request):
+        detail = request.query_params.get('detail', 'low')
+        if detail not in boundary_topologies:
+            return Response({'message': 'detail must be one of {}'.format(
+                ', '.join(boundary_topologies))},
+                status=status.HTTP_400_BAD_REQUEST)
+        body = boundary_topologies[detail].get()
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(body, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(body),
+                                    content_type='application/json')
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+class MedicalCategoryApi(CachedResponseMixin, SparseFieldsetViewMixin,
+                         viewsets.ModelViewSet):
+    queryset = MedicalFacilityCategory.objects.prefetch_related(
+        'Category').order_by('id')
     serializer_class = MedicalFacilityCategorySerializer
+    cache_models = (MedicalFacilityCategory, MedicalFacilityType)
+    cache_actions = ('retrieve',)
+
+    def list(self, request, *args, **kwargs):
+        catalog = category_catalog.get()
+        if has_sparse_fieldset(request):
+            # the catalog is prebuilt, so ?fields= / ?omit= narrow its rows
+            names = sparse_field_names(
+                request, self.get_serializer_class()().fields)
+            catalog = [{name: row[name] for name in names} for row in catalog]
+        return Response(catalog)
 
     def get_permissions(self):
         """
@@ -222,9 +688,11 @@ class MedicalCategoryApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class MedicalTypeApi(viewsets.ModelViewSet):
+class MedicalTypeApi(CachedResponseMixin, SparseFieldsetViewMixin,
+                     viewsets.ModelViewSet):
     queryset = MedicalFacilityType.objects.order_by('id')
     serializer_class = MedicalFacilityTypeSerializer
+    cache_models = (MedicalFacilityType,)
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['id', 'category']
 
@@ -239,9 +707,11 @@ class MedicalTypeApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class CaseApi(viewsets.ModelViewSet):
+class CaseApi(KeysetPaginationMixin, StreamingListMixin,
+              SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = CovidCases.objects.order_by('id')
     serializer_class = CaseSerializer
+    keyset_field = None
 
     def get_permissions(self):
         """
@@ -254,9 +724,11 @@ class CaseApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class ProvinceApi(viewsets.ModelViewSet):
+class ProvinceApi(CachedResponseMixin, SparseFieldsetViewMixin,
+                  viewsets.ModelViewSet):
     queryset = Province.objects.order_by('id')
     serializer_class = ProvinceSerializer
+    cache_models = (Province, MedicalFacility)
 
     def get_permissions(self):
         """
@@ -269,9 +741,31 @@ class ProvinceApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class MunicipalityApi(viewsets.ModelViewSet):
+class MunicipalityApi(CachedResponseMixin, SparseFieldsetViewMixin,
+                      viewsets.ModelViewSet):
+    """
+    Lists leave out the boundary unless asked for with `?geom=full`; maps
+    should use boundaries/municipality/ instead.
+    """
     queryset = Municipality.objects.order_by('id')
     serializer_class = MunicipalitySerializer
+    list_serializer_class = MunicipalityListSerializer
+    cache_models = (Municipality, MedicalFacility)
+
+    def full_geometry(self):
+        return self.action != 'list' or \
+            self.request.query_params.get('geom') == 'full'
+
+    def get_queryset(self):
+        queryset = super(MunicipalityApi, self).get_queryset()
+        if self.full_geometry():
+            return queryset.defer('geom_low', 'geom_medium', 'geom_high')
+        return queryset.defer('geom', 'geom_low', 'geom_medium', 'geom_high')
+
+    def get_serializer_class(self):
+        if self.full_geometry():
+            return super(MunicipalityApi, self).get_serializer_class()
+        return self.list_serializer_class
 
     def get_permissions(self):
         """
@@ -284,9 +778,11 @@ class MunicipalityApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class DistrictApi(viewsets.ModelViewSet):
+class DistrictApi(CachedResponseMixin, SparseFieldsetViewMixin,
+                  viewsets.ModelViewSet):
     queryset = District.objects.order_by('id')
     serializer_class = DistrictSerializer
+    cache_models = (District, MedicalFacility)
 
     def get_permissions(self):
         """
@@ -299,7 +795,7 @@ class DistrictApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class ProvinceDataApi(viewsets.ModelViewSet):
+class ProvinceDataApi(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = ProvinceData.objects.order_by('id')
     serializer_class = ProvinceDataSerializer
     permission_classes = [IsFrontendUser]
@@ -308,15 +804,17 @@ class ProvinceDataApi(viewsets.ModelViewSet):
     filterset_fields = ['province_id']
 
     def get_queryset(self):
-        queryset = ProvinceData.objects.order_by('id')
+        queryset = ProvinceData.objects.select_related(
+            'province_id').order_by('id')
         province_id = self.request.query_params.get("province_id")
         if province_id is not None:
             queryset = queryset.filter(province_id=province_id)
         return queryset
 
 
-class DistrictDataApi(viewsets.ModelViewSet):
-    queryset = DistrictData.objects.order_by('id')
+class DistrictDataApi(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    queryset = DistrictData.objects.select_related(
+        'district_id').order_by('id')
     serializer_class = DistrictDataSerializer
 
     filter_backends = [DjangoFilterBackend]
@@ -333,8 +831,9 @@ class DistrictDataApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class MuncDataApi(viewsets.ModelViewSet):
-    queryset = MuniData.objects.order_by('id')
+class MuncDataApi(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    queryset = MuniData.objects.select_related(
+        'municipality_id').order_by('id')
     serializer_class = MuncDataSerializer
 
     filter_backends = [DjangoFilterBackend]
@@ -351,6 +850,28 @@ class MuncDataApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
+class SnapshotIngestAPI(views.APIView):
+    """
+    Accepts a whole day of municipality or district snapshots at once,
+    either as a json list or as an uploaded csv/json `file`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, level):
+        try:
+            if 'file' in request.FILES:
+                rows = read_snapshot_file(request.FILES['file'])
+            else:
+                rows = request.data
+            if not isinstance(rows, list):
+                raise SnapshotIngestError('expected a list of rows')
+            result = ingest_snapshots(level, rows)
+        except SnapshotIngestError as e:
+            return Response({'message': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
 class CustomAuthToken(ObtainAuthToken):
 
     def post(self, request, *args, **kwargs):
@@ -380,7 +901,8 @@ def create_auth(request):
         return Response(serialized._errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserLocationApi(viewsets.ModelViewSet):
+class UserLocationApi(KeysetPaginationMixin, StreamingListMixin,
+                      SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = UserLocation.objects.all()
     serializer_class = UserLocationSerializer
 
@@ -400,11 +922,15 @@ class UserLocationApi(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class UserReportApi(viewsets.ModelViewSet):
+class UserReportApi(KeysetPaginationMixin, SparseFieldsetViewMixin,
+                    viewsets.ModelViewSet):
     queryset = UserReport.objects.all()
     serializer_class = UserReportSerializer
     small_serializer_class = SmallUserReportSerializer
     pagination_class = BigResultsSetPagination
+    filter_backends = [DjangoFilterBackend, GeometryFilterBackend]
+    filterset_fields = ['province', 'district', 'municipality',
+                        'country_name', 'flight_name']
 
     def get_serializer_class(self):
         data_type = self.request.query_params.get('data_type', "all")
@@ -475,56 +1001,46 @@ class UserReportApi(viewsets.ModelViewSet):
                                                   85.56619027])
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        if request.query_params.get('buffered') == '1':
+            return self.buffered_create(serializer)
         self.perform_create(serializer)
-        temperature = serializer.data['temperature']
-        travel_history = serializer.data['travel_history']
-        try:
-            data = json.loads(travel_history)
-            if not isinstance(data, dict):
-                print(data)
-                raise ValueError(" failed to parse json")
-        except Exception as e:
-            print(e)
-            data = {}
-        has_travel_history = data.get('has_travel_history', False)
-        has_convid_contact = data.get('has_convid_contact', False)
-        has_covid_contact = data.get('has_covid_contact', False)
-        if not has_covid_contact and has_convid_contact:
-            has_covid_contact = has_convid_contact
-        message = "प्रारम्भिक परिक्षणमा तपाईले बुझाउनु भएका शारीरिक लक्षण वा " \
-                  "यात्रा विवरणका आधारमा तपाइँलाई कोभीड-१९ को संक्रमण हुने" \
-                  " सम्भावन कम देखिन्छ। यद्यपि परिक्षणबिना संक्रमण भए नभएको " \
-                  "थाहा नहुने हुनाले सकेसम्म हुलमुलमा नगई बाह्य सम्पर्क कम गरि " \
-                  "संक्रमण फैलिन नदिन सहयोग गर्नुहोस्। तपाइलाई संका भएमा थप " \
-                  "परिक्षण गर्नको निम्ति निम्न सम्पर्क नम्बर वा नजिकको कोभिड-१९ " \
-                  "सम्बन्धि सेवाका लागी नेपाल सरकारद्वारा तोकिएको स्वास्थ्य संस्थामा सम्पर्क गर्नुहोस्।"
-        result = "lesslikely"
-        if temperature >= 102 and (has_travel_history or has_covid_contact):
-            message = "प्रारम्भिक परिक्षणमा तपाईले बुझाउनु भएका लक्षण वा यात्रा विवरणका " \
-                      "आधारमा तपाईँलाई कोभीड-१९ को संक्रमण भएको हुनसक्ने देखिन्छ। " \
-                      "कृपया कोभिड-१९ को थप परिक्षण गर्नको निम्ति निम्न सम्पर्क नम्बर वा" \
-                      " नजिकको कोभिड-१९ सम्बन्धि सेवाका लागी नेपाल सरकारद्वारा तोकिएको " \
-                      "स्वास्थ्य संस्थामा सम्पर्क गर्नुहोस्। त्यतिन्जेल सेल्फ क्वारेन्टाइनमा बस्नुहोस् र" \
-                      " अन्य व्यक्तिहरुसँग सम्पर्क नगरि कोरोना संक्रमण फैलन नदिन सहयोग गर्नुहोस्।"
-            result = "morelikely"
-        elif temperature >= 98 and (has_travel_history or has_covid_contact):
-            message = "प्रारम्भिक परिक्षणमा तपाईले बुझाउनु भएका लक्षण वा यात्रा विवरणका " \
-                      "आधारमा तपाईँलाई कोभीड-१९ को संक्रमण भएको हुनसक्ने देखिन्छ। " \
-                      "कृपया कोभिड-१९ को थप परिक्षण गर्नको निम्ति निम्न सम्पर्क नम्बर वा" \
-                      " नजिकको कोभिड-१९ सम्बन्धि सेवाका लागी नेपाल सरकारद्वारा तोकिएको " \
-                      "स्वास्थ्य संस्थामा सम्पर्क गर्नुहोस्। त्यतिन्जेल सेल्फ क्वारेन्टाइनमा बस्नुहोस् र" \
-                      " अन्य व्यक्तिहरुसँग सम्पर्क नगरि कोरोना संक्रमण फैलन नदिन सहयोग गर्नुहोस्।"
-            result = "likely"
-
+        message, result = risk_message(serializer.instance)
         headers = self.get_success_headers(serializer.data)
         return Response({"message": message, "result":result},
                         status=status.HTTP_201_CREATED,
                         headers=headers)
 
+    def buffered_create(self, serializer):
+        """
+        `?buffered=1`: the report is validated and classified now but only
+        appended to the redis buffer, which flush_user_reports writes in
+        bulk. The response is the same as for a direct create. While redis
+        is unavailable the report is saved directly instead.
+        """
+        data = dict(serializer.validated_data)
+        if self.request.user and not self.request.user.is_anonymous:
+            data['user'] = self.request.user
+        report = UserReport(**data)
+        report.assign_derived_fields(administrative_units=False)
+        try:
+            pending = buffer_user_report(data)
+        except BUFFER_UNAVAILABLE_ERRORS:
+            self.perform_create(serializer)
+            report = serializer.instance
+        else:
+            if pending >= settings.USER_REPORT_BUFFER_BATCH and \
+                    request_user_report_flush():
+                flush_user_reports.apply_async(queue="default")
+        message, result = risk_message(report)
+        return Response({"message": message, "result": result},
+                        status=status.HTTP_201_CREATED)
+
 
-class AgeGroupDataApi(viewsets.ModelViewSet):
+class AgeGroupDataApi(CachedResponseMixin, StreamingListMixin,
+                      SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = AgeGroupData.objects.all()
     serializer_class = AgeGroupDataSerializer
+    cache_models = (AgeGroupData,)
 
     def get_permissions(self):
         """
@@ -537,7 +1053,7 @@ class AgeGroupDataApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class DeviceApi(viewsets.ModelViewSet):
+class DeviceApi(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Device.objects.all()
     serializer_class = DeviceSerializer
 
@@ -559,9 +1075,11 @@ class DeviceApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class SuspectApi(viewsets.ModelViewSet):
+class SuspectApi(KeysetPaginationMixin, SparseFieldsetViewMixin,
+                 viewsets.ModelViewSet):
     queryset = SuspectReport.objects.all()
     serializer_class = SuspectSerializer
+    keyset_field = None
 
     def get_permissions(self):
         """
@@ -575,9 +1093,11 @@ class SuspectApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class GlobalDataApi(viewsets.ModelViewSet):
+class GlobalDataApi(CachedResponseMixin, SparseFieldsetViewMixin,
+                    viewsets.ModelViewSet):
     queryset = GlobalData.objects.all()
     serializer_class = GlobalDataSerializer
+    cache_models = (GlobalData,)
 
     def get_permissions(self):
         """
@@ -590,7 +1110,7 @@ class GlobalDataApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class ApplicationDataApi(viewsets.ModelViewSet):
+class ApplicationDataApi(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = ApplicationStat.objects.all()
     serializer_class = ApplicationDataSerializer
     permission_classes = [IsFrontendUser]
@@ -606,9 +1126,11 @@ class ApplicationDataApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class FAQApi(viewsets.ModelViewSet):
+class FAQApi(CachedResponseMixin, SparseFieldsetViewMixin,
+             viewsets.ModelViewSet):
     queryset = FAQ.objects.all()
     serializer_class = FAQSerializer
+    cache_models = (FAQ,)
     permission_classes = [IsFrontendUser]
 
     def perform_create(self, serializer):
@@ -625,9 +1147,11 @@ class FAQApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class NewsApi(viewsets.ModelViewSet):
+class NewsApi(CachedResponseMixin, SparseFieldsetViewMixin,
+              viewsets.ModelViewSet):
     queryset = News.objects.all()
     serializer_class = NewsSerializer
+    cache_models = (News,)
     permission_classes = [IsFrontendUser]
 
     def perform_create(self, serializer):
@@ -644,9 +1168,11 @@ class NewsApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class VersionDataApi(viewsets.ModelViewSet):
+class VersionDataApi(CachedResponseMixin, SparseFieldsetViewMixin,
+                     viewsets.ModelViewSet):
     queryset = MobileVersion.objects.all()
     serializer_class = MobileVersionSerializer
+    cache_models = (MobileVersion,)
 
     def get_permissions(self):
         """
@@ -659,52 +1185,58 @@ class VersionDataApi(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
+NEAR_FACILITY_DEFAULT = 10
+NEAR_FACILITY_MAX = 100
+NEAR_FACILITY_KM = 500
+
+
 class NearFacilityViewSet(views.APIView):
+    """
+    Nearest facilities to `lat`/`long` through an index-assisted KNN search.
+    Optional `category`, `type` and `ownership` filters, `limit` (default
+    10) and `km` (default 500) cap on the distance.
+    """
     permission_classes = [IsFrontendUser]
 
     def get(self, request):
         params = request.query_params
-        longitude = params['long']
-        latitude = params['lat']
-
-        user_location = GEOSGeometry('POINT({} {})'.format(longitude, latitude), srid=4326)
-
-        resource_queryset = MedicalFacility.objects.filter(
-            location__distance_lte=(user_location, D(km=500))).annotate(
-            distance=Distance(
-                'location', user_location)).order_by('distance')[:10]
-        resource_json = SpaceSerializer(resource_queryset, many=True)
-        json_data = JSONRenderer().render(resource_json.data)
-        stream = io.BytesIO(json_data)
-        data = JSONParser().parse(stream)
-        return Response(data)
+        try:
+            user_location = Point(float(params['long']), float(params['lat']),
+                                  srid=4326)
+            limit = min(int(params.get('limit', NEAR_FACILITY_DEFAULT)),
+                        NEAR_FACILITY_MAX)
+            km = float(params.get('km', NEAR_FACILITY_KM))
+        except (KeyError, ValueError):
+            return Response({'message': 'lat and long are required numbers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = MedicalFacility.objects.all()
+        for param in ('category', 'type', 'ownership'):
+            if params.get(param):
+                queryset = queryset.filter(**{param: params[param]})
+        facilities = nearest(queryset, user_location, max(limit, 1),
+                             max_distance=D(km=km))
+        return Response(SpaceSerializer(facilities, many=True).data)
+
+
+FACILITY_GEOJSON_FIELDS = (
+    'pk', 'name', 'location', 'province', 'district', 'municipality',
+    'category', 'type', 'ownership', 'contact_person', 'contact_num',
+    'used_for_corona_response', 'num_of_bed', 'num_of_icu_bed',
+    'occupied_isolation_bed', 'occupied_ventilators', 'occupied_icu_bed',
+    'num_of_isolation_bed', 'num_of_ventilators', 'total_in_isolation',
+    'total_death', 'total_positive', 'total_tested')
+REPORT_GEOJSON_FIELDS = ('pk', 'name', 'location')
 
 
 class SpaceGeojsonViewSet(views.APIView):
     permission_classes = [IsFrontendUser]
 
+    @conditional_response(facility_validators)
     def get(self, request):
-        serializers = serialize(
-            'geojson', MedicalFacility.objects.all(),
-            geometry_field='location', fields=('pk', 'name', 'location',
-                                               'province', 'district', 
-                                               'municipality', 'category', 
-                                               'type', 'ownership', 
-                                               'contact_person', 
-                                               'contact_num', 
-                                               'used_for_corona_response', 
-                                               'num_of_bed', 
-                                               'num_of_icu_bed', 
-                                               'occupied_isolation_bed', 
-                                               'occupied_ventilators', 
-                                               'occupied_icu_bed',
-                                               'num_of_isolation_bed',
-                                               'num_of_ventilators',
-                                               'total_in_isolation', 
-                                               'total_death', 
-                                               'total_positive','total_tested'))
-        geojson = json.loads(serializers)
-        return Response(geojson)
+        return StreamingHttpResponse(stream_feature_collection(
+            MedicalFacility.objects.order_by('id'), 'location',
+            FACILITY_GEOJSON_FIELDS), content_type='application/json')
 
 
 class NearUserReportViewSet(views.APIView):
@@ -734,8 +1266,100 @@ class NearUserGeojsonViewSet(views.APIView):
     permission_classes = [IsFrontendUser]
 
     def get(self, request):
-        serializers = serialize(
-            'geojson', UserReport.objects.filter(result="morelikely"),
-            geometry_field='location', fields=('pk', 'name', 'location'))
-        geojson = json.loads(serializers)
-        return Response(geojson)
+        return StreamingHttpResponse(stream_feature_collection(
+            UserReport.objects.filter(result="morelikely"), 'location',
+            REPORT_GEOJSON_FIELDS), content_type='application/json')
+
+
+class UserReportClusterViewSet(views.APIView):
+    """
+    Clustered reports inside `bbox` (xmin,ymin,xmax,ymax) for map `zoom`,
+    as a FeatureCollection of cluster centroids with a `count` each.
+    """
+    permission_classes = [IsFrontendUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            bbox = [float(v) for v in params['bbox'].split(',')]
+            zoom = int(params['zoom'])
+        except (KeyError, ValueError):
+            return Response({'message': 'bbox and zoom are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(bbox) != 4 or not 0 <= zoom <= 22:
+            return Response({'message': 'bbox must be xmin,ymin,xmax,ymax '
+                                        'and zoom between 0 and 22'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(grid_tiles(zoom, bbox)) > CLUSTER_MAX_TILES:
+            return Response({'message': 'bbox is too large for this zoom'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        features = cluster_features(
+            UserReport, params.get('result', 'morelikely'), zoom, bbox)
+        return Response({'type': 'FeatureCollection', 'features': features})
+
+
+DENSITY_SOURCES = {'report': UserReport, 'location': UserLocation}
+
+
+class DensityViewSet(views.APIView):
+    """
+    Row counts per quadkey cell of reports or location pings at `zoom`
+    (one of CELL_ZOOMS), optionally within `bbox`.
+    """
+    permission_classes = [IsFrontendUser]
+
+    def get(self, request, source):
+        if source not in DENSITY_SOURCES:
+            raise NotFound('Unknown density source.')
+        params = request.query_params
+        try:
+            zoom = int(params.get('zoom', CELL_ZOOMS[0]))
+        except ValueError:
+            zoom = None
+        if zoom not in CELL_ZOOMS:
+            return Response({'message': 'zoom must be one of {}'.format(
+                ', '.join(str(z) for z in CELL_ZOOMS))},
+                status=status.HTTP_400_BAD_REQUEST)
+        queryset = DENSITY_SOURCES[source].objects.filter(
+            cell_z8__isnull=False)
+        if params.get('bbox'):
+            try:
+                bbox = Polygon.from_bbox(
+                    [float(v) for v in params['bbox'].split(',')])
+            except (ValueError, TypeError):
+                return Response({'message': 'bbox must be xmin,ymin,xmax,ymax'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            bbox.srid = 4326
+            queryset = queryset.filter(location__bboverlaps=bbox)
+        if source == 'report' and params.get('result'):
+            queryset = queryset.filter(result=params['result'])
+        field = 'cell_z{}'.format(zoom)
+        cells = queryset.order_by().values_list(field).annotate(
+            count=Count('id'))
+        return Response([{'cell': cell, 'count': count,
+                          'bbox': quadkey_bounds(cell, zoom)}
+                         for cell, count in cells])
+
+
+class VectorTileView(views.APIView):
+    """
+    Mapbox vector tiles rendered by PostGIS, see api/tiles.py.
+    """
+
+    def get_permissions(self):
+        layer = TILE_LAYERS.get(self.kwargs.get('layer'))
+        if layer is None or layer['public']:
+            permission_classes = [AllowAny]
+        else:
+            permission_classes = [IsFrontendUser]
+        return [permission() for permission in permission_classes]
+
+    @conditional_response(tile_validators)
+    def get(self, request, layer, z, x, y):
+        if layer not in TILE_LAYERS:
+            raise NotFound('Unknown tile layer.')
+        if not valid_tile(z, x, y):
+            raise NotFound('Tile out of range.')
+        tile, version = get_tile(layer, z, x, y)
+        return HttpResponse(
+            tile, content_type='application/vnd.mapbox-vector-tile')
@@ -142,6 +142,35 @@ HOTLINE = os.environ.get("HOTLINE", "9851255834, 9851255837, 9851255839 :8 AM 
 
 CELERY_RESULT_BACKEND = 'django-db'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get("REDIS_CACHE_URL",
+                                   "redis://redis_main:6379/1"),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'IGNORE_EXCEPTIONS': True,
+        }
+    }
+}
+
+# Roll municipality snapshots up into the active district and province rows.
+SNAPSHOT_ROLLUP = os.environ.get("SNAPSHOT_ROLLUP", "False") == "True"
+
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT",
+                                            60 * 60 * 24))
+
+# Buffered user reports (`?buffered=1`) are flushed once this many are
+# waiting, and at least every USER_REPORT_BUFFER_INTERVAL seconds.
+USER_REPORT_BUFFER_BATCH = int(os.environ.get("USER_REPORT_BUFFER_BATCH",
+                                              500))
+USER_REPORT_BUFFER_INTERVAL = float(os.environ.get(
+    "USER_REPORT_BUFFER_INTERVAL", 5))
+
+# Rendered vector tiles, one directory per layer and data version.
+TILE_CACHE_ROOT = os.environ.get("TILE_CACHE_ROOT",
+                                 os.path.join(MEDIA_ROOT, 'tiles'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',
@@ -185,5 +214,10 @@ CELERY_BEAT_SCHEDULE = {
         "schedule": crontab(minute='*/30'),
         'options': {'queue': 'beat'}
 
+    },
+    "flush_user_reports": {
+        "task": "api.tasks.flush_user_reports",
+        "schedule": USER_REPORT_BUFFER_INTERVAL,
+        'options': {'queue': 'beat'}
     }
 }
\ No newline at end of file